@@ -3,16 +3,18 @@ import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
-from sqlalchemy import pool
+from sqlalchemy import pool, text
 
 from alembic import context
 
 # Add the backend directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Make migration_helpers importable from revision scripts
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import our models and database configuration
 from database import Base, engine
-from config import settings
+import migration_helpers  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -27,6 +29,11 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Revisions removed from the chain, mapped to the revision that replaces them
+LEGACY_REVISIONS = {
+    "d4eaa8b50127": "106c91df64b4",  # documentation-only GUID revision
+}
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -40,8 +47,28 @@ def get_url():
     if url:
         return url
     
-    # Fallback to settings
-    return settings.database_url
+    # Fall back to the URL database.py already resolved (PostgreSQL or the
+    # SQLite fallback) when it built the engine, rather than probing again
+    return engine.url.render_as_string(hide_password=False)
+
+
+def remap_legacy_revisions(connection) -> None:
+    """Re-stamp a database that still points at a removed revision.
+
+    Reads version_num through the migration context once, inside the migration
+    transaction, and only writes when it is one of LEGACY_REVISIONS. Offline
+    (--sql) runs cannot see the database and do not remap; stamp such a
+    database with the replacement revision first.
+    """
+    heads = context.get_context().get_current_heads()
+    legacy = [head for head in heads if head in LEGACY_REVISIONS]
+    if not legacy:
+        return
+    for old in legacy:
+        connection.execute(
+            text("UPDATE alembic_version SET version_num = :new WHERE version_num = :old"),
+            {"new": LEGACY_REVISIONS[old], "old": old},
+        )
 
 
 def run_migrations_offline() -> None:
@@ -66,6 +93,8 @@ def run_migrations_offline() -> None:
         compare_server_default=True,
     )
 
+    # No remap_legacy_revisions() here: the script is generated without reading
+    # alembic_version (see its docstring)
     with context.begin_transaction():
         context.run_migrations()
 
@@ -96,6 +125,8 @@ def run_migrations_online() -> None:
         )
 
         with context.begin_transaction():
+            # Same transaction as the migrations, so no separate COMMIT
+            remap_legacy_revisions(connection)
             context.run_migrations()
 
 
@@ -0,0 +1,42 @@
+"""
+Shared helpers for Alembic data migrations and index builds.
+Import from a revision with `from migration_helpers import seed`.
+"""
+
+import contextlib
+from typing import Any, Dict, List, Optional
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# PostgreSQL caps a single statement at 65535 bind parameters
+MAX_BIND_PARAMS = 65535
+
+
+def seed(table_name: str, rows: List[Dict[str, Any]], batch_size: Optional[int] = None) -> None:
+    """
+    Bulk insert seed rows with op.bulk_insert (Core executemany), in batches.
+    The default batch size is the most rows that fit under the bind parameter limit.
+    """
+    if not rows:
+        return
+
+    columns = list(rows[0])
+    table = sa.table(table_name, *(sa.column(name) for name in columns))
+    batch_size = batch_size or max(1, MAX_BIND_PARAMS // len(columns))
+
+    for start in range(0, len(rows), batch_size):
+        op.bulk_insert(table, rows[start:start + batch_size])
+
+
+def use_concurrent_indexes() -> bool:
+    """Opt in with `alembic upgrade head -x concurrent=1` when migrating a live database."""
+    value = context.get_x_argument(as_dictionary=True).get('concurrent', '')
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def index_block(concurrent: bool):
+    """Autocommit block for CONCURRENTLY index DDL, which cannot run inside a transaction."""
+    if concurrent:
+        return op.get_context().autocommit_block()
+    return contextlib.nullcontext()
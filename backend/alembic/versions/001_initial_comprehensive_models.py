@@ -5,140 +5,274 @@ Revises:
 Create Date: 2025-09-10 23:23:00.000000
 
 """
+from datetime import date, datetime
 from typing import Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy.dialects import postgresql
 
+from migration_helpers import index_block, use_concurrent_indexes
+
 # revision identifiers, used by Alembic.
 revision: str = '001_initial'
 down_revision: Union[str, None] = None
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# UUID columns are declared with the native PostgreSQL type here. On other
+# databases the GUID TypeDecorator in models.py stores them as CHAR(36), which
+# needs no schema change (this note replaces the empty d4eaa8b50127 revision).
+
+
+# Enum types as name -> values; created by the DO block in _create_tables()
+_ENUM_TYPES = {
+    'moodlevel': ('very_negative', 'negative', 'neutral', 'positive', 'very_positive'),
+    'connectionstatus': ('pending', 'active', 'completed', 'blocked'),
+}
+
+# Partitioned tables; PostgreSQL cannot build their indexes CONCURRENTLY
+_PARTITIONED_TABLES = {'emotion_records'}
+
+# Foreign keys to users(id), added NOT VALID after any seed data and validated last.
+# emotion_records keeps its inline FK: partitioned tables reject NOT VALID FKs.
+_DEFERRED_FOREIGN_KEYS = [
+    ('peer_connections', 'peer_connections_requester_id_fkey', 'requester_id'),
+    ('peer_connections', 'peer_connections_target_id_fkey', 'target_id'),
+    ('crisis_alerts', 'crisis_alerts_user_id_fkey', 'user_id'),
+    ('chat_messages', 'chat_messages_sender_id_fkey', 'sender_id'),
+    ('chat_messages', 'chat_messages_receiver_id_fkey', 'receiver_id'),
+]
+
+# Default CLUSTER index per table. emotion_records is left out: PostgreSQL cannot
+# mark an index clustered on a partitioned table (cluster its partitions instead).
+_CLUSTER_INDEXES = {
+    'chat_messages': 'idx_message_receiver_created',
+}
+
+# Monthly emotion_records partitions created up front: the month the migration
+# runs in and this many after it. Frozen here rather than imported from models.py
+# so that later app changes cannot alter this revision's DDL.
+_EMOTION_PARTITIONS_AHEAD = 3
+
+# Per-table storage parameters, applied right after the tables are created
+_STORAGE_PARAMETERS = {
+    'users': 'fillfactor = 90',
+    'peer_connections': 'fillfactor = 90',
+    'crisis_alerts': 'fillfactor = 90',
+    'chat_messages': 'fillfactor = 90, autovacuum_vacuum_scale_factor = 0.02',
+}
+
+# Hot enum columns are stored as SMALLINT codes (the member's position in the
+# models.py enum) guarded by a CHECK constraint:
+#   emotion      happy=0, sad=1, angry=2, fear=3, surprise=4, disgust=5, neutral=6
+#   source       webcam=0, voice=1, text=2
+#   risk_level   low=0, medium=1, high=2, critical=3
+#   message_type text=0, system=1, emergency=2
+
+# Secondary indexes as (name, table, definition); built by _create_secondary_indexes()
+_SECONDARY_INDEXES = [
+    ('idx_user_email_active', 'users', '(email, is_active)'),
+    ('idx_user_created_at', 'users', 'USING BRIN (created_at) WITH (pages_per_range = 32)'),
+
+    ('idx_emotion_user_created', 'emotion_records', '(user_id, created_at DESC) INCLUDE (emotion, source, confidence)'),
+    ('idx_emotion_brin', 'emotion_records', 'USING BRIN (emotion, source, created_at)'),
+
+    ('idx_peer_requester_status', 'peer_connections', '(requester_id, status)'),
+    ('idx_peer_target_status', 'peer_connections', '(target_id, status)'),
+    ('idx_peer_created_at', 'peer_connections', 'USING BRIN (created_at) WITH (pages_per_range = 32)'),
+
+    ('idx_crisis_user_created', 'crisis_alerts', '(user_id, created_at)'),
+    ('idx_crisis_high_risk', 'crisis_alerts', '(user_id, created_at DESC) WHERE risk_level IN (2, 3)'),
+    ('idx_crisis_unresolved', 'crisis_alerts', '(user_id) WHERE resolved_at IS NULL'),
+
+    ('idx_message_sender_created', 'chat_messages', '(sender_id, created_at)'),
+    ('idx_message_receiver_created', 'chat_messages', '(receiver_id, created_at)'),
+    ('idx_message_unread', 'chat_messages', '(receiver_id, created_at) WHERE read_at IS NULL'),
+    ('idx_message_type_created', 'chat_messages', '(message_type, created_at)'),
+]
+
 
 def upgrade() -> None:
-    # Create enum types with checkfirst=True to avoid duplicates
-    mood_level = postgresql.ENUM('very_negative', 'negative', 'neutral', 'positive', 'very_positive', name='moodlevel')
-    mood_level.create(op.get_bind(), checkfirst=True)
-    
-    emotion_type = postgresql.ENUM('happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral', name='emotiontype')
-    emotion_type.create(op.get_bind(), checkfirst=True)
-    
-    data_source = postgresql.ENUM('webcam', 'voice', 'text', name='datasource')
-    data_source.create(op.get_bind(), checkfirst=True)
-    
-    connection_status = postgresql.ENUM('pending', 'active', 'completed', 'blocked', name='connectionstatus')
-    connection_status.create(op.get_bind(), checkfirst=True)
-    
-    risk_level = postgresql.ENUM('low', 'medium', 'high', 'critical', name='risklevel')
-    risk_level.create(op.get_bind(), checkfirst=True)
-    
-    message_type = postgresql.ENUM('text', 'system', 'emergency', name='messagetype')
-    message_type.create(op.get_bind(), checkfirst=True)
+    _create_tables()
+    # Bulk seed/COPY steps belong here, before the foreign keys and secondary
+    # indexes exist, so loaded rows pay neither per-row FK checks nor btree updates
+    _create_fks_deferred()
+    _create_secondary_indexes()
+    _validate_fks()
+
+
+def _create_tables() -> None:
+    # gen_random_uuid() backs the id server defaults (built in from PostgreSQL 13)
+    op.execute('CREATE EXTENSION IF NOT EXISTS pgcrypto')
+
+    # Create all enum types in one round trip; skip any that already exist
+    op.execute(
+        "DO $$ BEGIN\n"
+        + "\n".join(
+            f"IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{name}') THEN "
+            f"CREATE TYPE {name} AS ENUM ({', '.join(repr(v) for v in values)}); END IF;"
+            for name, values in _ENUM_TYPES.items()
+        )
+        + "\nEND $$"
+    )
+
+    # create_type=False: the DO block above already created them
+    mood_level = postgresql.ENUM(*_ENUM_TYPES['moodlevel'], name='moodlevel', create_type=False)
+    connection_status = postgresql.ENUM(*_ENUM_TYPES['connectionstatus'], name='connectionstatus', create_type=False)
 
     # Create users table
     op.create_table('users',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
-        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False, unique=True, index=True),
         sa.Column('password_hash', sa.String(length=255), nullable=False),
         sa.Column('baseline_mood', mood_level, nullable=False),
         sa.Column('emergency_contact_name', sa.String(length=255), nullable=True),
         sa.Column('emergency_contact_phone', sa.String(length=20), nullable=True),
         sa.Column('is_active', sa.Boolean(), nullable=False),
         sa.Column('email_verified', sa.Boolean(), nullable=False),
-        sa.Column('privacy_settings', sa.JSON(), nullable=False),
+        sa.Column('privacy_settings', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
         sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
         sa.PrimaryKeyConstraint('id'),
         sa.CheckConstraint('length(email) > 0', name='email_not_empty'),
         sa.CheckConstraint('length(password_hash) > 0', name='password_hash_not_empty')
     )
-    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
-    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
-    op.create_index('idx_user_email_active', 'users', ['email', 'is_active'], unique=False)
-    op.create_index('idx_user_created_at', 'users', ['created_at'], unique=False)
 
-    # Create emotion_records table
+    # Create emotion_records table, range-partitioned by month on created_at.
+    # The partition key has to be part of the primary key.
     op.create_table('emotion_records',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
         sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
-        sa.Column('emotion', emotion_type, nullable=False),
+        sa.Column('emotion', sa.SmallInteger(), nullable=False),
         sa.Column('confidence', sa.Float(), nullable=False),
-        sa.Column('source', data_source, nullable=False),
-        sa.Column('raw_data', sa.JSON(), nullable=False),
+        sa.Column('source', sa.SmallInteger(), nullable=False),
+        sa.Column('raw_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
-        sa.PrimaryKeyConstraint('id'),
-        sa.CheckConstraint('confidence >= 0.0 AND confidence <= 1.0', name='confidence_range')
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        sa.CheckConstraint('confidence >= 0.0 AND confidence <= 1.0', name='confidence_range'),
+        sa.CheckConstraint('emotion BETWEEN 0 AND 6', name='emotion_range'),
+        sa.CheckConstraint('source BETWEEN 0 AND 2', name='source_range'),
+        postgresql_partition_by='RANGE (created_at)'
     )
-    op.create_index(op.f('ix_emotion_records_id'), 'emotion_records', ['id'], unique=False)
-    op.create_index('idx_emotion_user_created', 'emotion_records', ['user_id', 'created_at'], unique=False)
-    op.create_index('idx_emotion_type_created', 'emotion_records', ['emotion', 'created_at'], unique=False)
-    op.create_index('idx_emotion_source_created', 'emotion_records', ['source', 'created_at'], unique=False)
+    # Monthly partitions from the month the migration runs in (rows arrive from
+    # then on); the Celery maintain_emotion_partitions task keeps creating them
+    # ahead after that. Only rows outside every monthly range land in the default
+    op.execute(";\n".join(
+        [_emotion_partition_ddl(datetime.utcnow().date(), n) for n in range(_EMOTION_PARTITIONS_AHEAD + 1)]
+        + ["CREATE TABLE emotion_records_default PARTITION OF emotion_records DEFAULT"]
+    ))
 
     # Create peer_connections table
     op.create_table('peer_connections',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
         sa.Column('requester_id', postgresql.UUID(as_uuid=True), nullable=False),
         sa.Column('target_id', postgresql.UUID(as_uuid=True), nullable=False),
         sa.Column('status', connection_status, nullable=False),
         sa.Column('similarity_score', sa.Float(), nullable=True),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
         sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
-        sa.ForeignKeyConstraint(['requester_id'], ['users.id'], ondelete='CASCADE'),
-        sa.ForeignKeyConstraint(['target_id'], ['users.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id'),
         sa.CheckConstraint('requester_id != target_id', name='no_self_connection'),
         sa.CheckConstraint('similarity_score IS NULL OR (similarity_score >= 0.0 AND similarity_score <= 1.0)', name='similarity_score_range'),
         sa.UniqueConstraint('requester_id', 'target_id', name='unique_connection_pair')
     )
-    op.create_index(op.f('ix_peer_connections_id'), 'peer_connections', ['id'], unique=False)
-    op.create_index('idx_peer_requester_status', 'peer_connections', ['requester_id', 'status'], unique=False)
-    op.create_index('idx_peer_target_status', 'peer_connections', ['target_id', 'status'], unique=False)
-    op.create_index('idx_peer_created_at', 'peer_connections', ['created_at'], unique=False)
 
     # Create crisis_alerts table
     op.create_table('crisis_alerts',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
         sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
-        sa.Column('risk_level', risk_level, nullable=False),
+        sa.Column('risk_level', sa.SmallInteger(), nullable=False),
         sa.Column('prediction_confidence', sa.Float(), nullable=False),
-        sa.Column('triggers', sa.JSON(), nullable=False),
+        sa.Column('triggers', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
         sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id'),
         sa.CheckConstraint('prediction_confidence >= 0.0 AND prediction_confidence <= 1.0', name='prediction_confidence_range'),
-        sa.CheckConstraint('resolved_at IS NULL OR resolved_at >= created_at', name='resolution_after_creation')
+        sa.CheckConstraint('resolved_at IS NULL OR resolved_at >= created_at', name='resolution_after_creation'),
+        sa.CheckConstraint('risk_level BETWEEN 0 AND 3', name='risk_level_range')
     )
-    op.create_index(op.f('ix_crisis_alerts_id'), 'crisis_alerts', ['id'], unique=False)
-    op.create_index('idx_crisis_user_created', 'crisis_alerts', ['user_id', 'created_at'], unique=False)
-    op.create_index('idx_crisis_risk_level', 'crisis_alerts', ['risk_level'], unique=False)
-    op.create_index('idx_crisis_unresolved', 'crisis_alerts', ['user_id', 'resolved_at'], unique=False)
 
     # Create chat_messages table
     op.create_table('chat_messages',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
         sa.Column('sender_id', postgresql.UUID(as_uuid=True), nullable=False),
         sa.Column('receiver_id', postgresql.UUID(as_uuid=True), nullable=False),
         sa.Column('content', sa.Text(), nullable=False),
-        sa.Column('message_type', message_type, nullable=False),
+        sa.Column('message_type', sa.SmallInteger(), nullable=False),
         sa.Column('read_at', sa.DateTime(timezone=True), nullable=True),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-        sa.ForeignKeyConstraint(['receiver_id'], ['users.id'], ondelete='CASCADE'),
-        sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id'),
         sa.CheckConstraint('sender_id != receiver_id', name='no_self_message'),
         sa.CheckConstraint('length(content) > 0', name='content_not_empty'),
-        sa.CheckConstraint('read_at IS NULL OR read_at >= created_at', name='read_after_creation')
+        sa.CheckConstraint('read_at IS NULL OR read_at >= created_at', name='read_after_creation'),
+        sa.CheckConstraint('message_type BETWEEN 0 AND 2', name='message_type_range')
+    )
+
+    # Leave room for HOT updates on mutable tables. emotion_records is append-only
+    # and partitioned (its partitions keep the default fillfactor of 100).
+    op.execute(";\n".join(
+        f"ALTER TABLE {table} SET ({params})"
+        for table, params in _STORAGE_PARAMETERS.items()
+    ))
+
+
+def _create_fks_deferred() -> None:
+    # NOT VALID only takes a brief lock and skips checking rows already loaded;
+    # rows inserted from here on are checked as usual
+    op.execute(";\n".join(
+        f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+        f"REFERENCES users (id) ON DELETE CASCADE NOT VALID"
+        for table, name, column in _DEFERRED_FOREIGN_KEYS
+    ))
+
+
+def _validate_fks() -> None:
+    # One scan per constraint under SHARE UPDATE EXCLUSIVE; writes keep flowing
+    op.execute(";\n".join(
+        f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"
+        for table, name, _ in _DEFERRED_FOREIGN_KEYS
+    ))
+
+
+def _create_secondary_indexes() -> None:
+    # Secondary indexes are built once, after the tables (and any seed data) exist.
+    if use_concurrent_indexes():
+        # CONCURRENTLY keeps the tables writable during the build but cannot
+        # run inside a transaction block, so each index is built in autocommit
+        with index_block(concurrent=True):
+            for name, table, definition in _SECONDARY_INDEXES:
+                concurrent = table not in _PARTITIONED_TABLES
+                op.execute(_create_index_ddl(name, table, definition, concurrent=concurrent))
+    else:
+        # Fresh bootstrap: all statements go out in a single round trip
+        op.execute(";\n".join(
+            _create_index_ddl(name, table, definition)
+            for name, table, definition in _SECONDARY_INDEXES
+        ))
+
+    # Record the default CLUSTER index so maintenance windows can run a bare
+    # `CLUSTER <table>` (or pg_repack) to lay timelines out contiguously
+    op.execute(";\n".join(
+        f"ALTER TABLE {table} CLUSTER ON {index}"
+        for table, index in _CLUSTER_INDEXES.items()
+    ))
+
+
+def _create_index_ddl(name: str, table: str, definition: str, concurrent: bool = False) -> str:
+    concurrently = "CONCURRENTLY " if concurrent else ""
+    return f"CREATE INDEX {concurrently}{name} ON {table} {definition}"
+
+
+def _emotion_partition_ddl(today: date, months_ahead: int) -> str:
+    start = today.year * 12 + today.month - 1 + months_ahead
+    lower = date(start // 12, start % 12 + 1, 1)
+    upper = date((start + 1) // 12, (start + 1) % 12 + 1, 1)
+    return (
+        f"CREATE TABLE emotion_records_{lower:%Y}m{lower:%m} PARTITION OF emotion_records "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
     )
-    op.create_index(op.f('ix_chat_messages_id'), 'chat_messages', ['id'], unique=False)
-    op.create_index('idx_message_sender_created', 'chat_messages', ['sender_id', 'created_at'], unique=False)
-    op.create_index('idx_message_receiver_created', 'chat_messages', ['receiver_id', 'created_at'], unique=False)
-    op.create_index('idx_message_unread', 'chat_messages', ['receiver_id', 'read_at'], unique=False)
-    op.create_index('idx_message_type_created', 'chat_messages', ['message_type', 'created_at'], unique=False)
 
 
 def downgrade() -> None:
@@ -150,9 +284,5 @@ def downgrade() -> None:
     op.drop_table('users')
     
     # Drop enum types
-    op.execute('DROP TYPE messagetype')
-    op.execute('DROP TYPE risklevel')
     op.execute('DROP TYPE connectionstatus')
-    op.execute('DROP TYPE datasource')
-    op.execute('DROP TYPE emotiontype')
     op.execute('DROP TYPE moodlevel')
@@ -19,10 +19,18 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+# Secondary indexes as (name, definition)
+_INDEXES = [
+    ('idx_ai_response_message_created', '(message_id, created_at)'),
+    ('idx_ai_response_model_created', '(model_name, created_at)'),
+    ('idx_ai_response_helpful', '(message_id) WHERE is_helpful = true'),
+]
+
+
 def upgrade() -> None:
     # Create ai_responses table
     op.create_table('ai_responses',
-        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False),
         sa.Column('message_id', postgresql.UUID(as_uuid=True), nullable=False),
         sa.Column('content', sa.Text(), nullable=False),
         sa.Column('response_type', sa.String(length=50), nullable=True),
@@ -33,38 +41,38 @@ def upgrade() -> None:
         sa.Column('tokens_used', sa.Integer(), nullable=True),
         sa.Column('processing_time', sa.Float(), nullable=True),
         sa.Column('confidence_score', sa.Float(), nullable=True),
-        sa.Column('sentiment', sa.String(length=50), nullable=True),
-        sa.Column('emotions', postgresql.JSON(astext_type=sa.Text()), nullable=True),
-        sa.Column('topics', postgresql.JSON(astext_type=sa.Text()), nullable=True),
-        sa.Column('suggestions', postgresql.JSON(astext_type=sa.Text()), nullable=True),
-        sa.Column('is_helpful', sa.Boolean(), nullable=True),
+        sa.Column('sentiment', sa.SmallInteger(), nullable=True),  # negative=-1, neutral=0, positive=1
+        sa.Column('emotions', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('topics', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('suggestions', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('is_helpful', sa.Boolean(), server_default=sa.text('false'), nullable=False),
         sa.Column('user_rating', sa.Integer(), nullable=True),
         sa.Column('feedback', sa.Text(), nullable=True),
         sa.Column('is_generated', sa.Boolean(), nullable=True),
-        sa.Column('is_reviewed', sa.Boolean(), nullable=True),
-        sa.Column('is_approved', sa.Boolean(), nullable=True),
+        sa.Column('is_reviewed', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+        sa.Column('is_approved', sa.Boolean(), server_default=sa.text('false'), nullable=False),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
         sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
         sa.ForeignKeyConstraint(['message_id'], ['chat_messages.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id'),
         sa.CheckConstraint('confidence_score IS NULL OR (confidence_score >= 0.0 AND confidence_score <= 1.0)', name='confidence_score_range'),
         sa.CheckConstraint('user_rating IS NULL OR (user_rating >= 1 AND user_rating <= 5)', name='user_rating_range'),
+        sa.CheckConstraint('sentiment IS NULL OR (sentiment >= -1 AND sentiment <= 1)', name='sentiment_range'),
         sa.CheckConstraint('length(content) > 0', name='content_not_empty')
     )
+    # Leave room for HOT updates from feedback/review flag changes
+    op.execute("ALTER TABLE ai_responses SET (fillfactor = 90, autovacuum_vacuum_scale_factor = 0.02)")
     
-    # Create indexes
-    op.create_index('idx_ai_response_message_created', 'ai_responses', ['message_id', 'created_at'], unique=False)
-    op.create_index('idx_ai_response_model_created', 'ai_responses', ['model_name', 'created_at'], unique=False)
-    op.create_index('idx_ai_response_helpful', 'ai_responses', ['is_helpful'], unique=False)
-    op.create_index(op.f('ix_ai_responses_id'), 'ai_responses', ['id'], unique=False)
+    # Create indexes in a single round trip
+    op.execute(";\n".join(
+        f"CREATE INDEX {name} ON ai_responses {definition}"
+        for name, definition in _INDEXES
+    ))
 
 
 def downgrade() -> None:
     # Drop indexes
-    op.drop_index(op.f('ix_ai_responses_id'), table_name='ai_responses')
-    op.drop_index('idx_ai_response_helpful', table_name='ai_responses')
-    op.drop_index('idx_ai_response_model_created', table_name='ai_responses')
-    op.drop_index('idx_ai_response_message_created', table_name='ai_responses')
+    op.execute(";\n".join(f"DROP INDEX {name}" for name, _ in reversed(_INDEXES)))
     
     # Drop table
     op.drop_table('ai_responses')
@@ -0,0 +1,28 @@
+"""Add a partial index on crisis_alerts.resolved_at for retention cleanup
+
+Revision ID: 3e5d8b27a6c1
+Revises: 7c2e9a41f3b8
+Create Date: 2025-09-12 14:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e5d8b27a6c1'
+down_revision: Union[str, None] = '7c2e9a41f3b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # cleanup_expired_sessions range-deletes resolved alerts by resolved_at
+    op.create_index('idx_crisis_resolved_at', 'crisis_alerts', ['resolved_at'],
+                    postgresql_where=sa.text('resolved_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('idx_crisis_resolved_at', table_name='crisis_alerts')
@@ -0,0 +1,66 @@
+"""Convert native enum columns on existing databases to SMALLINT codes
+
+Revision ID: 5d1e7a93b2c4
+Revises: 9b4f1d62c0e7
+Create Date: 2025-09-14 10:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1e7a93b2c4'
+down_revision: Union[str, None] = '9b4f1d62c0e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columns that databases created before 001_initial switched to SMALLINT still
+# hold as native enums: (table, column, enum type, values in code order, check).
+# Codes are frozen here to match SmallIntEnum in models.py at the time of writing.
+_ENUM_COLUMNS = [
+    ('emotion_records', 'emotion', 'emotiontype',
+     ('happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral'), 'emotion_range'),
+    ('emotion_records', 'source', 'datasource', ('webcam', 'voice', 'text'), 'source_range'),
+    ('crisis_alerts', 'risk_level', 'risklevel', ('low', 'medium', 'high', 'critical'), 'risk_level_range'),
+    ('chat_messages', 'message_type', 'messagetype', ('text', 'system', 'emergency'), 'message_type_range'),
+]
+
+
+def upgrade() -> None:
+    # Fresh databases already have SMALLINT columns from 001_initial; only the
+    # columns still typed as one of the old enums are converted
+    enum_columns = set(op.get_bind().execute(sa.text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND udt_name = ANY(:types)"
+    ), {'types': [enum_type for _, _, enum_type, _, _ in _ENUM_COLUMNS]}).all())
+
+    # One ALTER TABLE per table, so each table is rewritten once
+    clauses = {}
+    for table, column, _, values, check in _ENUM_COLUMNS:
+        if (table, column) not in enum_columns:
+            continue
+        cases = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+        clauses.setdefault(table, []).extend([
+            f"ALTER COLUMN {column} TYPE smallint USING (CASE {column}::text {cases} END)",
+            f"ADD CONSTRAINT {check} CHECK ({column} BETWEEN 0 AND {len(values) - 1})",
+        ])
+    if not clauses:
+        return
+
+    op.execute(";\n".join(
+        f"ALTER TABLE {table} " + ", ".join(table_clauses)
+        for table, table_clauses in clauses.items()
+    ))
+    op.execute(";\n".join(
+        f"DROP TYPE IF EXISTS {enum_type}" for _, _, enum_type, _, _ in _ENUM_COLUMNS
+    ))
+
+
+def downgrade() -> None:
+    # 001_initial creates these columns as SMALLINT, so there is no enum schema
+    # to go back to at this point in the history
+    pass
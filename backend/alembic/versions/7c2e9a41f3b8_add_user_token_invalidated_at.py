@@ -0,0 +1,27 @@
+"""Add users.token_invalidated_at watermark for bulk token revocation
+
+Revision ID: 7c2e9a41f3b8
+Revises: 106c91df64b4
+Create Date: 2025-09-12 10:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9a41f3b8'
+down_revision: Union[str, None] = '106c91df64b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable with no default, so PostgreSQL adds it without rewriting the table
+    op.add_column('users', sa.Column('token_invalidated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_invalidated_at')
@@ -0,0 +1,47 @@
+"""Add indexes for the Celery task queries
+
+Revision ID: 9b4f1d62c0e7
+Revises: 3e5d8b27a6c1
+Create Date: 2025-09-13 10:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import index_block, use_concurrent_indexes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f1d62c0e7'
+down_revision: Union[str, None] = '3e5d8b27a6c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    concurrent = use_concurrent_indexes()
+    with index_block(concurrent):
+        # generate_daily_metrics: active users by updated_at
+        op.create_index('idx_user_active_updated', 'users', ['is_active', 'updated_at'],
+                        postgresql_concurrently=concurrent)
+        # check_user_crisis_indicators: a user's unresolved alerts in a time window;
+        # supersedes the user_id-only idx_crisis_unresolved
+        op.create_index('idx_crisis_user_created_unresolved', 'crisis_alerts', ['user_id', 'created_at'],
+                        postgresql_where=sa.text('resolved_at IS NULL'),
+                        postgresql_concurrently=concurrent)
+        op.drop_index('idx_crisis_unresolved', table_name='crisis_alerts',
+                      postgresql_concurrently=concurrent)
+        # generate_daily_metrics: messages by created_at
+        op.create_index('idx_message_created_at', 'chat_messages', ['created_at'],
+                        postgresql_using='brin', postgresql_with={'pages_per_range': 32},
+                        postgresql_concurrently=concurrent)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_message_created_at', table_name='chat_messages')
+    op.create_index('idx_crisis_unresolved', 'crisis_alerts', ['user_id'],
+                    postgresql_where=sa.text('resolved_at IS NULL'))
+    op.drop_index('idx_crisis_user_created_unresolved', table_name='crisis_alerts')
+    op.drop_index('idx_user_active_updated', table_name='users')
@@ -0,0 +1,79 @@
+"""Backfill ai_responses review flags and convert sentiment/JSON columns on existing databases
+
+Revision ID: c7a3f1e9d842
+Revises: 5d1e7a93b2c4
+Create Date: 2025-09-14 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a3f1e9d842'
+down_revision: Union[str, None] = '5d1e7a93b2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Review flags that 106c91df64b4 now creates NOT NULL DEFAULT false
+_FLAG_COLUMNS = ('is_helpful', 'is_reviewed', 'is_approved')
+_JSON_COLUMNS = ('emotions', 'topics', 'suggestions')
+# Sentiment labels by SMALLINT code (models.Sentiment with offset -1)
+_SENTIMENT_CODES = {'negative': -1, 'neutral': 0, 'positive': 1}
+
+
+def upgrade() -> None:
+    # Databases that ran 106c91df64b4 before it was edited in place still have
+    # nullable flags, a VARCHAR sentiment and JSON columns; fresh ones need nothing
+    columns = {
+        name: (udt_name, is_nullable == 'YES')
+        for name, udt_name, is_nullable in op.get_bind().execute(sa.text(
+            "SELECT column_name, udt_name, is_nullable FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'ai_responses'"
+        )).all()
+    }
+
+    nullable_flags = [column for column in _FLAG_COLUMNS if columns[column][1]]
+    if nullable_flags:
+        # Backfill before SET NOT NULL; one pass over the rows that need it
+        op.execute(
+            "UPDATE ai_responses SET "
+            + ", ".join(f"{column} = coalesce({column}, false)" for column in nullable_flags)
+            + " WHERE " + " OR ".join(f"{column} IS NULL" for column in nullable_flags)
+        )
+
+    # Everything else goes in one ALTER TABLE, so the table is rewritten once
+    clauses = []
+    for column in nullable_flags:
+        clauses += [f"ALTER COLUMN {column} SET DEFAULT false", f"ALTER COLUMN {column} SET NOT NULL"]
+    if columns['sentiment'][0] != 'int2':
+        cases = " ".join(f"WHEN '{label}' THEN {code}" for label, code in _SENTIMENT_CODES.items())
+        clauses += [
+            f"ALTER COLUMN sentiment TYPE smallint USING (CASE lower(sentiment) {cases} END)",
+            "ADD CONSTRAINT sentiment_range CHECK (sentiment IS NULL OR (sentiment >= -1 AND sentiment <= 1))",
+        ]
+    clauses += [
+        f"ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"
+        for column in _JSON_COLUMNS if columns[column][0] != 'jsonb'
+    ]
+    if clauses:
+        op.execute("ALTER TABLE ai_responses " + ", ".join(clauses))
+
+    # The helpful index became partial once is_helpful could no longer be NULL
+    helpful_index = op.get_bind().execute(sa.text(
+        "SELECT indexdef FROM pg_indexes WHERE indexname = 'idx_ai_response_helpful'"
+    )).scalar()
+    if helpful_index is not None and ' WHERE ' not in helpful_index:
+        op.execute(
+            "DROP INDEX idx_ai_response_helpful;\n"
+            "CREATE INDEX idx_ai_response_helpful ON ai_responses (message_id) WHERE is_helpful = true"
+        )
+
+
+def downgrade() -> None:
+    # 106c91df64b4 creates ai_responses in this shape already, so there is no
+    # older schema to go back to at this point in the history
+    pass
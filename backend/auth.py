@@ -3,10 +3,20 @@ Authentication and authorization module for Mind Bridge AI.
 Handles JWT tokens, user authentication, and security middleware.
 """
 
+import os
 import re
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
 import logging
-import redis
-from datetime import datetime, timedelta
+import threading
+import redis.asyncio as aioredis
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List
 from uuid import UUID
 
@@ -14,37 +24,86 @@ from fastapi import (
     APIRouter, Depends, HTTPException, status, Request, 
     BackgroundTasks, Response
 )
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
-from pydantic import BaseModel, EmailStr, validator
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
+import jwt
+from jwt import InvalidTokenError as JWTError
+from cachetools import TTLCache
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from config import settings
 from database import get_db
 from models import User, MoodLevel
+from security import JWT_SIGNING_KEY, JWT_VERIFY_KEY, pwd_context
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Security setup
-security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Redis connection for rate limiting and token blacklisting
-try:
-    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-    redis_client.ping()  # Test connection
-    logger.info("Redis connection established for auth module")
-except Exception as e:
-    logger.error(f"Failed to connect to Redis: {e}")
-    redis_client = None
+async def _bearer(request: Request) -> str:
+    """Extract the bearer token from the Authorization header."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token
+
+# Redis connection for rate limiting and token blacklisting (pinged by init_redis at startup)
+redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True, max_connections=100)
+
+# Atomic INCRBY + first-hit EXPIRE for fixed-window rate limiting (one round trip)
+RATE_LIMIT_LUA = """
+local current = redis.call('INCRBY', KEYS[1], ARGV[2])
+if current == tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return current
+"""
+rate_limit_script = redis_client.register_script(RATE_LIMIT_LUA)
+
+async def init_redis() -> None:
+    """Test the auth Redis connection; disable Redis-backed checks if it is unreachable."""
+    global redis_client, rate_limit_script
+    try:
+        await redis_client.ping()
+        logger.info("Redis connection established for auth module")
+    except Exception as e:
+        logger.error(f"Failed to connect to Redis: {e}")
+        redis_client = None
+        rate_limit_script = None
+
+# Short-lived cache of verified JWT payloads, keyed by a token digest so raw
+# tokens are never held in memory. Expiry and revocation are still checked on hits.
+JWT_CACHE_TTL_SECONDS = 30
+_jwt_cache = TTLCache(maxsize=10000, ttl=JWT_CACHE_TTL_SECONDS)
+_jwt_cache_lock = threading.Lock()
+
+# Frozen CurrentUser snapshots of active users by id. Entries are dropped
+# whenever the row is modified through this module.
+USER_CACHE_TTL_SECONDS = 60
+_user_cache = TTLCache(maxsize=5000, ttl=USER_CACHE_TTL_SECONDS)
+_user_cache_lock = threading.Lock()
+
+# Validation patterns, compiled once at import
+_RE_UPPER = re.compile(r'[A-Z]')
+_RE_LOWER = re.compile(r'[a-z]')
+_RE_DIGIT = re.compile(r'\d')
+_RE_PHONE = re.compile(r'^\+?[\d\s\-\(\)]{10,20}$')
+
+# Characters stripped by sanitize_input
+_UNSAFE_CHARS = '<>"\''
+_SANITIZE_TABLE = str.maketrans('', '', _UNSAFE_CHARS)
 
 # Pydantic Models
 class UserRegister(BaseModel):
     """User registration request model."""
+    model_config = ConfigDict(frozen=True)
+
     email: EmailStr
     password: str
     baseline_mood: MoodLevel
@@ -52,28 +111,38 @@ class UserRegister(BaseModel):
     emergency_contact_phone: Optional[str] = None
     privacy_settings: Optional[Dict[str, Any]] = None
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         """Validate password strength."""
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters long')
-        if not re.search(r'[A-Z]', v):
+        if not _RE_UPPER.search(v):
             raise ValueError('Password must contain at least one uppercase letter')
-        if not re.search(r'[a-z]', v):
+        if not _RE_LOWER.search(v):
             raise ValueError('Password must contain at least one lowercase letter')
-        if not re.search(r'\d', v):
+        if not _RE_DIGIT.search(v):
             raise ValueError('Password must contain at least one number')
         return v
 
-    @validator('emergency_contact_phone')
+    @field_validator('emergency_contact_name', mode='before')
+    @classmethod
+    def sanitize_contact_name(cls, v):
+        """Strip unsafe characters from the free-text contact name."""
+        return sanitize_input(v) if isinstance(v, str) else v
+
+    @field_validator('emergency_contact_phone')
+    @classmethod
     def validate_phone(cls, v):
         """Validate phone number format."""
-        if v and not re.match(r'^\+?[\d\s\-\(\)]{10,20}$', v):
+        if v and not _RE_PHONE.match(v):
             raise ValueError('Invalid phone number format')
         return v
 
 class UserLogin(BaseModel):
     """User login request model."""
+    model_config = ConfigDict(frozen=True)
+
     email: EmailStr
     password: str
 
@@ -85,51 +154,104 @@ class TokenResponse(BaseModel):
     expires_in: int
 
 class UserProfile(BaseModel):
-    """User profile response model."""
-    id: str
+    """User profile response model, validated straight from a User row."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
     email: str
-    baseline_mood: str
+    baseline_mood: MoodLevel
     emergency_contact_name: Optional[str]
     emergency_contact_phone: Optional[str]
     is_active: bool
     email_verified: bool
     privacy_settings: Dict[str, Any]
-    created_at: str
-    updated_at: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+class CurrentUser(UserProfile):
+    """
+    Frozen snapshot of the authenticated user, as returned by get_current_user.
+    One cached instance is shared by concurrent requests, so it is read-only and
+    carries no session; handlers that write load the row with db.get(User, ...).
+    """
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    token_invalidated_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert user to dictionary for API responses."""
+        return self.model_dump(mode="json", exclude={"token_invalidated_at"})
 
 class RefreshTokenRequest(BaseModel):
     """Refresh token request model."""
+    model_config = ConfigDict(frozen=True)
+
     refresh_token: str
 
 class LogoutRequest(BaseModel):
     """Logout request model."""
+    model_config = ConfigDict(frozen=True)
+
     refresh_token: str
 
 # JWT Utilities
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# For HS* algorithms, {"sub": ...} tokens are signed directly against a pre-encoded
+# header and a pre-keyed HMAC, skipping PyJWT's dict copy and JSON round trip
+_HS_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+if settings.ALGORITHM in _HS_DIGESTS:
+    _JWT_HEADER_B64 = _b64url(json.dumps({"alg": settings.ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode())
+    _JWT_HMAC = hmac.new(settings.SECRET_KEY.encode(), digestmod=_HS_DIGESTS[settings.ALGORITHM])
+else:
+    _JWT_HMAC = None
+
+def _encode_token(data: Dict[str, Any], token_type: str, lifetime: timedelta) -> str:
+    """Sign `data` plus the exp/iat/type/jti claims."""
+    now = time.time()
+    exp = int(now + lifetime.total_seconds())
+    jti = secrets.token_urlsafe(12)
+    
+    if _JWT_HMAC is not None and data.keys() == {"sub"}:
+        payload = f'{{"sub":{json.dumps(data["sub"])},"exp":{exp},"iat":{now!r},"type":"{token_type}","jti":"{jti}"}}'
+        signing_input = _JWT_HEADER_B64 + b"." + _b64url(payload.encode())
+        mac = _JWT_HMAC.copy()
+        mac.update(signing_input)
+        return (signing_input + b"." + _b64url(mac.digest())).decode()
+    
+    to_encode = data.copy()
+    to_encode.update({"exp": exp, "iat": now, "type": token_type, "jti": jti})
+    return jwt.encode(to_encode, JWT_SIGNING_KEY, algorithm=settings.ALGORITHM)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return _encode_token(data, "access", expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
 
 def create_refresh_token(data: Dict[str, Any]) -> str:
     """Create JWT refresh token."""
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return _encode_token(data, "refresh", timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
+
+def _decode_token_cached(token: str) -> Dict[str, Any]:
+    """Decode a JWT, reusing a recently verified payload for the same token."""
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(key)
+    
+    # A cached payload is only reused while the token itself is unexpired
+    if payload is None or payload.get("exp", 0) <= time.time():
+        payload = jwt.decode(
+            token, JWT_VERIFY_KEY, algorithms=[settings.ALGORITHM],
+            options={"require": ["exp", "sub", "type"]}
+        )
+        with _jwt_cache_lock:
+            _jwt_cache[key] = payload
+    return payload
 
-def verify_token(token: str, token_type: str = "access") -> Dict[str, Any]:
-    """Verify and decode JWT token."""
+async def verify_token(token: str, token_type: str = "access", check_blacklist: bool = True) -> Dict[str, Any]:
+    """Verify and decode JWT token; callers may run the blacklist check themselves."""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = _decode_token_cached(token)
         
         # Check token type
         if payload.get("type") != token_type:
@@ -140,7 +262,7 @@ def verify_token(token: str, token_type: str = "access") -> Dict[str, Any]:
             )
         
         # Check if token is blacklisted
-        if is_token_blacklisted(token):
+        if check_blacklist and await is_token_blacklisted(payload, token):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has been revoked",
@@ -156,37 +278,77 @@ def verify_token(token: str, token_type: str = "access") -> Dict[str, Any]:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def is_token_blacklisted(token: str) -> bool:
+def _blacklist_key(payload: Dict[str, Any], token: str) -> str:
+    """Blacklist key for a token: its jti, or a short digest for tokens issued without one."""
+    jti = payload.get("jti")
+    if not jti:
+        jti = hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+    return f"bl:{jti}"
+
+async def is_token_blacklisted(payload: Dict[str, Any], token: str) -> bool:
     """Check if token is blacklisted."""
     if not redis_client:
         return False
     
     try:
-        return redis_client.exists(f"blacklist:{token}") > 0
+        keys = [_blacklist_key(payload, token)]
+        if "jti" not in payload:
+            # Entries written before jti keys (EXISTS checks both in one round trip)
+            keys.append(f"blacklist:{token}")
+        return await redis_client.exists(*keys) > 0
     except Exception as e:
         logger.error(f"Error checking token blacklist: {e}")
         return False
 
-def blacklist_token(token: str, expires_in: int = None) -> bool:
-    """Add token to blacklist."""
+async def blacklist_token(payload: Dict[str, Any], token: str) -> bool:
+    """Add an already verified token to the blacklist until it expires."""
     if not redis_client:
         return False
     
     try:
-        if expires_in is None:
-            # Get token expiration from JWT payload
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            expires_in = payload.get("exp", 0) - int(datetime.utcnow().timestamp())
-        
+        expires_in = payload["exp"] - int(time.time())
         if expires_in > 0:
-            redis_client.setex(f"blacklist:{token}", expires_in, "1")
+            await redis_client.setex(_blacklist_key(payload, token), expires_in, "1")
             return True
         return False
     except Exception as e:
         logger.error(f"Error blacklisting token: {e}")
         return False
 
+# Each user's token_invalidated_at is also published to Redis (epoch seconds) so a
+# logout-all reaches every worker at once instead of after their user caches expire
+def _watermark_key(user_id: Any) -> str:
+    return f"tiv:{user_id}"
+
+async def get_invalidation_watermark(user_id: Any) -> Optional[float]:
+    """Return the user's published token_invalidated_at, or None."""
+    if not redis_client:
+        return None
+    
+    try:
+        value = await redis_client.get(_watermark_key(user_id))
+        return float(value) if value else None
+    except Exception as e:
+        logger.error(f"Error reading token invalidation watermark: {e}")
+        return None
+
+async def publish_invalidation_watermark(user_id: Any, watermark: datetime) -> bool:
+    """Publish token_invalidated_at until every token issued before it has expired."""
+    if not redis_client:
+        return False
+    
+    try:
+        lifetime = int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+        await redis_client.setex(_watermark_key(user_id), lifetime, repr(watermark.timestamp()))
+        return True
+    except Exception as e:
+        logger.error(f"Error publishing token invalidation watermark: {e}")
+        return False
+
 # Password Utilities
+# Optional process pool for bcrypt; only worth its IPC overhead at higher bcrypt costs
+_bcrypt_pool = ProcessPoolExecutor(max_workers=os.cpu_count()) if settings.BCRYPT_USE_PROCESS_POOL else None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -195,19 +357,28 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+async def _run_bcrypt(func, *args):
+    """Run a password helper in the bcrypt process pool, or a worker thread if it is disabled."""
+    if _bcrypt_pool is not None:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_pool, func, *args)
+    return await asyncio.to_thread(func, *args)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password off the event loop."""
+    return await _run_bcrypt(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password off the event loop."""
+    return await _run_bcrypt(get_password_hash, password)
+
 # Rate Limiting
-def check_rate_limit(identifier: str, limit: int, window: int) -> bool:
-    """Check if request is within rate limit."""
+async def check_rate_limit(identifier: str, limit: int, window: int, hits: int = 1) -> bool:
+    """Record `hits` requests and check if the identifier is within rate limit."""
     if not redis_client:
         return True  # Allow if Redis is not available
     
     try:
-        key = f"rate_limit:{identifier}"
-        current = redis_client.incr(key)
-        
-        if current == 1:
-            redis_client.expire(key, window)
-        
+        current = await rate_limit_script(keys=[f"rate_limit:{identifier}"], args=[window, hits])
         return current <= limit
     except Exception as e:
         logger.error(f"Rate limit check failed: {e}")
@@ -219,39 +390,83 @@ def sanitize_input(text: str) -> str:
     if not text:
         return text
     
-    # Remove potentially dangerous characters
-    sanitized = re.sub(r'[<>"\']', '', text)
+    # Remove potentially dangerous characters (skipped when there are none)
+    if any(c in text for c in _UNSAFE_CHARS):
+        text = text.translate(_SANITIZE_TABLE)
     # Limit length
-    return sanitized[:1000]
+    return text[:1000]
+
+def invalidate_cached_user(user_id: Any) -> None:
+    """Drop a user from the get_current_user cache after the row changes."""
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+
+def _issued_before_invalidation(payload: Dict[str, Any], user: Any, published: Optional[float] = None) -> bool:
+    """True if the token predates the user's token_invalidated_at or the `published` watermark."""
+    cutoff = published or 0.0
+    watermark = user.token_invalidated_at
+    if watermark is not None:
+        if watermark.tzinfo is None:
+            watermark = watermark.replace(tzinfo=timezone.utc)  # SQLite returns naive UTC
+        cutoff = max(cutoff, watermark.timestamp())
+    return payload.get("iat", 0) < cutoff
+
+def _load_active_user(db: Session, user_id: str) -> Optional[CurrentUser]:
+    """Load an active user and cache a frozen snapshot of it."""
+    row = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    if row is None:
+        return None
+    user = CurrentUser.model_validate(row)
+    with _user_cache_lock:
+        _user_cache[user_id] = user
+    return user
+
+async def _get_active_user(db: Session, user_id: str) -> Optional[CurrentUser]:
+    """Return the cached user, or load it in a worker thread."""
+    with _user_cache_lock:
+        user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    return await asyncio.to_thread(_load_active_user, db, user_id)
 
 # Dependencies
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token: str = Depends(_bearer),
     db: Session = Depends(get_db)
-) -> User:
+) -> CurrentUser:
     """Get current authenticated user."""
-    token = credentials.credentials
-    payload = verify_token(token, "access")
+    payload = await verify_token(token, "access", check_blacklist=False)
     
-    user_id = payload.get("sub")
-    if user_id is None:
+    # Once the token is decoded, the blacklist and watermark checks (Redis) and
+    # the user lookup (cache or DB) are independent, so run them concurrently.
+    # The cached user may hold a stale watermark; the published one is current
+    blacklisted, published_watermark, user = await asyncio.gather(
+        is_token_blacklisted(payload, token),
+        get_invalidation_watermark(payload["sub"]),
+        _get_active_user(db, payload["sub"]),
+    )
+    if blacklisted:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if _issued_before_invalidation(payload, user, published_watermark):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(
@@ -260,38 +475,54 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         )
     return current_user
 
-# Security Middleware
-class SecurityMiddleware(BaseHTTPMiddleware):
-    """Security middleware for input sanitization and basic protection."""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Sanitize query parameters
-        if request.query_params:
-            sanitized_params = {}
-            for key, value in request.query_params.items():
-                sanitized_params[key] = sanitize_input(value)
-            request._query_params = sanitized_params
-        
-        response = await call_next(request)
-        return response
-
 # Rate Limiting Middleware
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware."""
+    """
+    Rate limiting middleware.
+    Requests are counted in-process first and only synced to Redis once a
+    client reaches its local threshold within the current window. That
+    threshold is LOCAL_BURST_RATIO of `calls` split across `workers`, so all
+    workers together admit at most that share of `calls` before Redis counts it.
+    """
     
-    def __init__(self, app, calls: int = 100, period: int = 60):
+    LOCAL_BURST_RATIO = 0.8
+    # Probe endpoints are never rate limited, so they skip the counters and Redis
+    EXCLUDED_PATHS = frozenset({"/health", "/health/detailed"})
+    
+    def __init__(self, app, calls: int = 100, period: int = 60, workers: int = 1):
         super().__init__(app)
         self.calls = calls
         self.period = period
+        self._local_threshold = int(calls * self.LOCAL_BURST_RATIO / max(workers, 1))
+        # client -> [hits, hits already sent to Redis, window start]
+        self._local_counts = TTLCache(maxsize=100_000, ttl=period)
+    
+    def _unsynced_hits(self, client_ip: str) -> int:
+        """Count a request locally; return the hits to sync to Redis, or 0 while under the local threshold."""
+        now = time.monotonic()
+        entry = self._local_counts.get(client_ip)
+        if entry is None or now - entry[2] >= self.period:
+            entry = [0, 0, now]
+            self._local_counts[client_ip] = entry
+        entry[0] += 1
+        if entry[0] < self._local_threshold:
+            return 0
+        pending = entry[0] - entry[1]
+        entry[1] = entry[0]
+        return pending
     
     async def dispatch(self, request: Request, call_next):
+        if request.scope["path"] in self.EXCLUDED_PATHS:
+            return await call_next(request)
+        
         # Get client IP
         client_ip = request.client.host
         if "x-forwarded-for" in request.headers:
             client_ip = request.headers["x-forwarded-for"].split(",")[0].strip()
         
         # Check rate limit
-        if not check_rate_limit(client_ip, self.calls, self.period):
+        hits = self._unsynced_hits(client_ip)
+        if hits and not await check_rate_limit(client_ip, self.calls, self.period, hits):
             return Response(
                 content="Rate limit exceeded",
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -312,36 +543,35 @@ async def register(
 ):
     """Register a new user."""
     try:
-        # Check if user already exists
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
-        # Create new user
-        hashed_password = get_password_hash(user_data.password)
-        new_user = User(
+        # Create new user; an existing email inserts nothing and returns no row,
+        # so the duplicate check and the insert are a single atomic round trip
+        hashed_password = await hash_password_async(user_data.password)
+        insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(User).values(
             email=user_data.email,
             password_hash=hashed_password,
             baseline_mood=user_data.baseline_mood,
-            emergency_contact_name=sanitize_input(user_data.emergency_contact_name) if user_data.emergency_contact_name else None,
+            emergency_contact_name=user_data.emergency_contact_name or None,
             emergency_contact_phone=user_data.emergency_contact_phone,
             privacy_settings=user_data.privacy_settings or {},
             is_active=True,
             email_verified=False
-        )
+        ).on_conflict_do_nothing(index_elements=[User.email]).returning(User.id)
         
-        db.add(new_user)
+        new_user_id = db.execute(stmt).scalar()
+        if new_user_id is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
         db.commit()
-        db.refresh(new_user)
         
         # Create tokens
-        access_token = create_access_token(data={"sub": str(new_user.id)})
-        refresh_token = create_refresh_token(data={"sub": str(new_user.id)})
+        access_token = create_access_token(data={"sub": str(new_user_id)})
+        refresh_token = create_refresh_token(data={"sub": str(new_user_id)})
         
-        logger.info(f"User registered successfully: {new_user.email}")
+        logger.info(f"User registered successfully: {user_data.email}")
         
         return TokenResponse(
             access_token=access_token,
@@ -349,13 +579,8 @@ async def register(
             expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
         )
         
-    except IntegrityError as e:
-        db.rollback()
-        logger.error(f"Database integrity error during registration: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Registration error: {e}")
@@ -377,7 +602,7 @@ async def login(
         client_ip = request.headers["x-forwarded-for"].split(",")[0].strip()
     
     # Check rate limit for login attempts
-    if not check_rate_limit(f"login:{client_ip}", settings.LOGIN_RATE_LIMIT_REQUESTS, settings.LOGIN_RATE_LIMIT_WINDOW):
+    if not await check_rate_limit(f"login:{client_ip}", settings.LOGIN_RATE_LIMIT_REQUESTS, settings.LOGIN_RATE_LIMIT_WINDOW):
         logger.warning(f"Login rate limit exceeded for IP: {client_ip}")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -386,9 +611,12 @@ async def login(
         )
     
     try:
-        # Find user
-        user = db.query(User).filter(User.email == user_credentials.email).first()
-        if not user or not verify_password(user_credentials.password, user.password_hash):
+        # Find user; only the columns needed for the password check are loaded
+        # until it passes, so failed attempts never materialize a full row
+        credentials = db.query(User.id, User.password_hash, User.is_active).filter(
+            User.email == user_credentials.email
+        ).first()
+        if not credentials or not await verify_password_async(user_credentials.password, credentials.password_hash):
             logger.warning(f"Failed login attempt for email: {user_credentials.email}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -396,12 +624,14 @@ async def login(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        if not user.is_active:
+        if not credentials.is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Account is deactivated"
             )
         
+        user = db.get(User, credentials.id)
+        
         # Create tokens
         access_token = create_access_token(data={"sub": str(user.id)})
         refresh_token = create_refresh_token(data={"sub": str(user.id)})
@@ -413,7 +643,7 @@ async def login(
             "refresh_token": refresh_token,
             "token_type": "bearer",
             "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            "user": UserProfile(**user.to_dict())
+            "user": UserProfile.model_validate(user)
         }
         
     except HTTPException:
@@ -432,15 +662,8 @@ async def refresh_token(
 ):
     """Refresh access token using refresh token."""
     try:
-        payload = verify_token(token_data.refresh_token, "refresh")
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid refresh token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        payload = await verify_token(token_data.refresh_token, "refresh")
+        user_id = payload["sub"]
         
         # Verify user still exists and is active
         user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
@@ -450,6 +673,12 @@ async def refresh_token(
                 detail="User not found or inactive",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        if _issued_before_invalidation(payload, user):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         
         # Create new access token
         access_token = create_access_token(data={"sub": str(user.id)})
@@ -475,17 +704,20 @@ async def refresh_token(
 @router.post("/logout")
 async def logout(
     token_data: LogoutRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Logout user and blacklist refresh token."""
     try:
-        # Blacklist the refresh token
-        blacklist_token(token_data.refresh_token)
+        # Blacklist the refresh token (verified once, then revoked by its payload)
+        payload = await verify_token(token_data.refresh_token, "refresh")
+        await blacklist_token(payload, token_data.refresh_token)
         
         logger.info(f"User logged out: {current_user.email}")
         
         return {"message": "Successfully logged out"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Logout error: {e}")
         raise HTTPException(
@@ -493,15 +725,42 @@ async def logout(
             detail="Logout failed"
         )
 
+@router.post("/logout-all")
+async def logout_all(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke every access and refresh token issued to the user so far."""
+    try:
+        user = db.get(User, current_user.id)
+        invalidated_at = datetime.now(timezone.utc)
+        user.token_invalidated_at = invalidated_at
+        db.commit()
+        invalidate_cached_user(current_user.id)
+        # Other workers may still have the user cached; they read this on every request
+        await publish_invalidation_watermark(current_user.id, invalidated_at)
+        
+        logger.info(f"User logged out of all sessions: {current_user.email}")
+        
+        return {"message": "Successfully logged out of all sessions"}
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Logout-all error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Logout failed"
+        )
+
 @router.get("/profile", response_model=UserProfile)
-async def get_profile(current_user: User = Depends(get_current_active_user)):
+async def get_profile(current_user: CurrentUser = Depends(get_current_active_user)):
     """Get current user profile."""
-    return UserProfile(**current_user.to_dict())
+    return current_user
 
 @router.put("/profile", response_model=UserProfile)
 async def update_profile(
     profile_data: Dict[str, Any],
-    current_user: User = Depends(get_current_active_user),
+    current_user: CurrentUser = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Update current user profile."""
@@ -520,17 +779,20 @@ async def update_profile(
             'emergency_contact_phone', 'privacy_settings'
         ]
         
+        # current_user is a frozen snapshot; update the session's row
+        user = db.get(User, current_user.id)
         for field in allowed_fields:
             if field in sanitized_data:
-                setattr(current_user, field, sanitized_data[field])
+                setattr(user, field, sanitized_data[field])
         
-        current_user.updated_at = datetime.utcnow()
+        user.updated_at = datetime.utcnow()
         db.commit()
-        db.refresh(current_user)
+        db.refresh(user)
+        invalidate_cached_user(user.id)
         
-        logger.info(f"Profile updated for user: {current_user.email}")
+        logger.info(f"Profile updated for user: {user.email}")
         
-        return UserProfile(**current_user.to_dict())
+        return UserProfile.model_validate(user)
         
     except Exception as e:
         db.rollback()
@@ -544,7 +806,10 @@ async def update_profile(
 @router.get("/health")
 async def auth_health():
     """Health check for auth module."""
-    redis_status = "connected" if redis_client and redis_client.ping() else "disconnected"
+    try:
+        redis_status = "connected" if redis_client and await redis_client.ping() else "disconnected"
+    except Exception:
+        redis_status = "disconnected"
     return {
         "status": "healthy",
         "redis": redis_status,
@@ -6,22 +6,62 @@ This module provides:
 - Periodic task scheduling with Celery Beat
 - Background tasks for crisis detection, cleanup, and metrics
 - Comprehensive error handling and retry logic
+
+Queues (see task_routes):
+- crisis: check_user_crisis_indicators
+- alerts: send_crisis_alert
+- maintenance: maintain_emotion_partitions, cleanup_expired_sessions,
+  database_backup
+- analytics: generate_daily_metrics
+- celery (default): check_all_users_crisis_indicators, ai_task, ai_task_batch
+- transient (non-durable, not persisted by the broker): health_check,
+  get_task_status
+
+Prefetch is tuned per worker rather than globally. Short tasks take a larger
+batch to amortize broker round trips, long tasks take one at a time so a busy
+worker does not hold queued work hostage:
+
+    celery -A celery_app worker -Q crisis,alerts,celery,transient --prefetch-multiplier=8 --max-tasks-per-child=2000 -O fair
+    celery -A celery_app worker -Q maintenance,analytics --prefetch-multiplier=1 --concurrency=2 --max-tasks-per-child=100 -O fair
+
+-O fair is required on every worker. Without it the prefork pool keeps
+assigning messages to a child that is busy with a long cleanup or backup, so
+they wait behind it while other children sit idle.
+
+Once AI inference is a remote HTTP call, run the AI tasks on an I/O pool
+(-P gevent -c 100); for local GPU inference use -P prefork -c <n_gpus> with
+--prefetch-multiplier=1 and --max-tasks-per-child=500, since model caches
+grow with each child.
+
+Children are recycled after worker_max_tasks_per_child tasks so memory held by
+sessions, pools and caches is returned; the --max-tasks-per-child flags above
+override the default per worker.
 """
 
+import json
+import time
+import heapq
 import logging
-import uuid
-from datetime import datetime, timedelta
+import re
+from itertools import groupby
+from operator import itemgetter
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Any
-from celery import Celery
+from celery import Celery, group
 from celery.schedules import crontab
 from celery.exceptions import Retry, MaxRetriesExceededError
 from celery.utils.log import get_task_logger
-from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError
+from kombu import Exchange, Queue
+from kombu.exceptions import OperationalError as BrokerOperationalError
+from sqlalchemy import and_, case, distinct, func, insert, literal, select, text, union_all
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError, SQLAlchemyError
 
 from config import settings
-from database import get_db_context, check_db_connection
-from models import User, EmotionRecord, CrisisAlert, ChatMessage, PeerConnection
+from database import get_db_context
+from models import (
+    User, EmotionRecord, CrisisAlert, ChatMessage, PeerConnection, uuid7,
+    emotion_partition_ddl, emotion_partition_months,
+)
 
 # Configure logging
 logger = get_task_logger(__name__)
@@ -49,14 +89,27 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=300,  # 5 minutes
     task_soft_time_limit=240,  # 4 minutes
-    worker_prefetch_multiplier=1,
+    worker_max_tasks_per_child=1000,  # Overridden per worker, see module docstring
     
-    # Task Routing
+    # Task Routing (workers must run with -O fair, see module docstring)
+    task_queues=(
+        Queue('celery'),
+        Queue('crisis'),
+        Queue('alerts'),
+        Queue('maintenance'),
+        Queue('analytics'),
+        Queue('transient', Exchange('transient', delivery_mode=1),
+              routing_key='transient', durable=False),
+    ),
     task_routes={
         'celery_app.check_user_crisis_indicators': {'queue': 'crisis'},
         'celery_app.send_crisis_alert': {'queue': 'alerts'},
+        'celery_app.maintain_emotion_partitions': {'queue': 'maintenance'},
         'celery_app.cleanup_expired_sessions': {'queue': 'maintenance'},
+        'celery_app.database_backup': {'queue': 'maintenance'},
         'celery_app.generate_daily_metrics': {'queue': 'analytics'},
+        'celery_app.health_check': {'queue': 'transient', 'delivery_mode': 'transient'},
+        'celery_app.get_task_status': {'queue': 'transient', 'delivery_mode': 'transient'},
     },
     
     # Retry Configuration
@@ -73,6 +126,10 @@ celery_app.conf.update(
             'task': 'celery_app.check_all_users_crisis_indicators',
             'schedule': crontab(minute='*/15'),  # Every 15 minutes
         },
+        'maintain-emotion-partitions': {
+            'task': 'celery_app.maintain_emotion_partitions',
+            'schedule': crontab(hour=1, minute=0),  # Daily at 1 AM
+        },
         'cleanup-expired-sessions': {
             'task': 'celery_app.cleanup_expired_sessions',
             'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
@@ -88,18 +145,35 @@ celery_app.conf.update(
     },
 )
 
+class DatabaseUnavailable(ConnectionError):
+    """The database could not be reached; retried like any connection error."""
+
+# Transient failures worth retrying; anything else (bad input, constraint
+# violations) fails the task straight away instead of occupying the queue
+RETRYABLE_ERRORS = (OperationalError, BrokerOperationalError, ConnectionError, TimeoutError)
+NON_RETRYABLE_ERRORS = (IntegrityError, DataError, ValueError)
+
 # Task Decorators for Retry Configuration
-def task_with_retry(max_retries=3, default_retry_delay=60, exponential_backoff=True):
-    """Decorator for tasks with retry configuration."""
+def task_with_retry(max_retries=3, default_retry_delay=60, exponential_backoff=True,
+                    ignore_result=False, retry_for=RETRYABLE_ERRORS, backoff_max=600):
+    """Decorator for tasks with retry configuration.
+
+    Pass ignore_result=True for fire-and-forget tasks whose return value is
+    only logged, so completion does not write to the result backend.
+    exponential_backoff may be a number of seconds to use as the backoff base;
+    retries are spaced base * 2**n apart, capped at backoff_max.
+    """
     def decorator(func):
         return celery_app.task(
             bind=True,
+            ignore_result=ignore_result,
             max_retries=max_retries,
             default_retry_delay=default_retry_delay,
-            autoretry_for=(Exception,),
+            autoretry_for=retry_for,
+            dont_autoretry_for=NON_RETRYABLE_ERRORS,
             retry_kwargs={'max_retries': max_retries},
             retry_backoff=exponential_backoff,
-            retry_backoff_max=600,  # Max 10 minutes
+            retry_backoff_max=backoff_max,
             retry_jitter=True,
         )(func)
     return decorator
@@ -108,7 +182,63 @@ def task_with_retry(max_retries=3, default_retry_delay=60, exponential_backoff=T
 # CRISIS DETECTION TASKS
 # ============================================================================
 
-@task_with_retry(max_retries=3)
+NEGATIVE_EMOTIONS = ['sad', 'angry', 'fear']
+EXTREME_EMOTIONS = ['sad', 'angry']  # counted when detected with confidence > 0.8
+
+def assess_crisis_risk(
+    emotion_count: int,
+    negative_count: int,
+    has_extreme: bool,
+    recent_confidences: List[float],
+    unresolved_alerts: int,
+) -> Dict[str, Any]:
+    """
+    Score crisis risk from a user's last 24 hours of activity.
+    
+    Args:
+        emotion_count: Number of emotion records
+        negative_count: How many of them are negative emotions
+        has_extreme: Whether any is a high-confidence extreme negative emotion
+        recent_confidences: Confidences of the newest records, newest first (up to 3)
+        unresolved_alerts: Number of unresolved crisis alerts
+    """
+    risk_indicators = []
+    risk_score = 0.0
+    
+    if emotion_count:
+        # Check for negative emotion patterns
+        if negative_count > emotion_count * 0.7:  # 70% negative
+            risk_indicators.append("High frequency of negative emotions")
+            risk_score += 0.3
+        
+        # Check for declining confidence
+        if len(recent_confidences) >= 3:
+            if all(recent_confidences[i] >= recent_confidences[i+1] for i in range(len(recent_confidences)-1)):
+                risk_indicators.append("Declining emotion detection confidence")
+                risk_score += 0.2
+        
+        # Check for extreme emotions
+        if has_extreme:
+            risk_indicators.append("High-confidence extreme negative emotions")
+            risk_score += 0.4
+    
+    if unresolved_alerts > 0:
+        risk_indicators.append("Recent unresolved crisis alerts")
+        risk_score += 0.5
+    
+    # Determine risk level
+    if risk_score >= 0.7:
+        risk_level = "critical"
+    elif risk_score >= 0.5:
+        risk_level = "high"
+    elif risk_score >= 0.3:
+        risk_level = "medium"
+    else:
+        risk_level = "low"
+    
+    return {"risk_level": risk_level, "risk_score": risk_score, "indicators": risk_indicators}
+
+@task_with_retry(max_retries=3, exponential_backoff=60)
 def check_user_crisis_indicators(self, user_id: str) -> Dict[str, Any]:
     """
     Check crisis indicators for a specific user.
@@ -129,168 +259,331 @@ def check_user_crisis_indicators(self, user_id: str) -> Dict[str, Any]:
                 logger.warning(f"User not found: {user_id}")
                 return {"error": "User not found", "user_id": user_id}
             
-            # Get recent emotion records (last 24 hours)
-            recent_emotions = db.query(EmotionRecord).filter(
+            # Aggregate the last 24 hours of emotion records in SQL, the same way
+            # the periodic scan does, instead of counting rows in Python;
+            # idx_emotion_user_created covers these columns for an index-only scan
+            cutoff = datetime.utcnow() - timedelta(hours=24)
+            window = (
                 EmotionRecord.user_id == user_id,
-                EmotionRecord.created_at >= datetime.utcnow() - timedelta(hours=24)
-            ).order_by(EmotionRecord.created_at.desc()).all()
-            
-            # Analyze emotion patterns
-            risk_indicators = []
-            risk_score = 0.0
-            
-            if recent_emotions:
-                # Check for negative emotion patterns
-                negative_emotions = [e for e in recent_emotions if e.emotion in ['sad', 'angry', 'fear']]
-                if len(negative_emotions) > len(recent_emotions) * 0.7:  # 70% negative
-                    risk_indicators.append("High frequency of negative emotions")
-                    risk_score += 0.3
-                
-                # Check for declining confidence
-                if len(recent_emotions) >= 3:
-                    recent_confidences = [e.confidence for e in recent_emotions[:3]]
-                    if all(recent_confidences[i] >= recent_confidences[i+1] for i in range(len(recent_confidences)-1)):
-                        risk_indicators.append("Declining emotion detection confidence")
-                        risk_score += 0.2
-                
-                # Check for extreme emotions
-                extreme_emotions = [e for e in recent_emotions if e.confidence > 0.8 and e.emotion in ['sad', 'angry']]
-                if extreme_emotions:
-                    risk_indicators.append("High-confidence extreme negative emotions")
-                    risk_score += 0.4
+                EmotionRecord.created_at >= cutoff
+            )
+            stats = db.query(
+                func.count().label('emotion_count'),
+                func.sum(case((EmotionRecord.emotion.in_(NEGATIVE_EMOTIONS), 1), else_=0)).label('negative_count'),
+                func.max(case((and_(
+                    EmotionRecord.confidence > 0.8,
+                    EmotionRecord.emotion.in_(EXTREME_EMOTIONS)
+                ), 1), else_=0)).label('has_extreme'),
+            ).filter(*window).one()
+            recent_confidences = [row.confidence for row in db.query(EmotionRecord.confidence).filter(
+                *window
+            ).order_by(EmotionRecord.created_at.desc()).limit(3)]
             
             # Check for recent crisis alerts
-            recent_alerts = db.query(CrisisAlert).filter(
+            recent_alerts = db.query(func.count()).select_from(CrisisAlert).filter(
                 CrisisAlert.user_id == user_id,
-                CrisisAlert.created_at >= datetime.utcnow() - timedelta(hours=24),
+                CrisisAlert.created_at >= cutoff,
                 CrisisAlert.resolved_at.is_(None)
-            ).count()
-            
-            if recent_alerts > 0:
-                risk_indicators.append("Recent unresolved crisis alerts")
-                risk_score += 0.5
+            ).scalar()
             
-            # Determine risk level
-            if risk_score >= 0.7:
-                risk_level = "critical"
-            elif risk_score >= 0.5:
-                risk_level = "high"
-            elif risk_score >= 0.3:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
+            # Analyze emotion patterns
+            assessment = assess_crisis_risk(
+                emotion_count=stats.emotion_count,
+                negative_count=stats.negative_count or 0,
+                has_extreme=bool(stats.has_extreme),
+                recent_confidences=recent_confidences,
+                unresolved_alerts=recent_alerts,
+            )
+            risk_level = assessment["risk_level"]
             
             result = {
                 "user_id": user_id,
-                "risk_level": risk_level,
-                "risk_score": risk_score,
-                "indicators": risk_indicators,
-                "emotion_count": len(recent_emotions),
+                **assessment,
+                "emotion_count": stats.emotion_count,
                 "checked_at": datetime.utcnow().isoformat()
             }
             
             # If high risk, trigger alert
             if risk_level in ["high", "critical"]:
-                send_crisis_alert.delay(user_id, risk_level)
+                send_crisis_alert.delay(
+                    user_id, risk_level, user.email,
+                    user.emergency_contact_name, user.emergency_contact_phone
+                )
             
             logger.info(f"Crisis check completed for user {user_id}: {risk_level}")
             return result
             
     except Exception as exc:
         logger.error(f"Error checking crisis indicators for user {user_id}: {str(exc)}")
-        # Retry with exponential backoff
-        raise self.retry(countdown=60 * (2 ** self.request.retries), exc=exc)
+        raise
 
-@task_with_retry(max_retries=3)
+# Rows fetched per round trip by the crisis scan, and alerts published per group
+CRISIS_SCAN_BATCH_SIZE = 1000
+
+def _queue_crisis_alerts(db, flagged: List[tuple]) -> List[Dict[str, Any]]:
+    """Publish send_crisis_alert for a batch of (user_id, risk_level) pairs."""
+    # Contact details for the flagged users, so send_crisis_alert
+    # does not have to look each one up again
+    contacts = {row.id: row for row in db.query(
+        User.id, User.email, User.emergency_contact_name, User.emergency_contact_phone
+    ).filter(User.id.in_([user_id for user_id, _ in flagged]))}
+    
+    # Publish the batch as one group over a single producer; each
+    # alert stays its own task so it keeps its own retries
+    signatures = []
+    for user_id, risk_level in flagged:
+        contact = contacts.get(user_id)
+        if contact:
+            signatures.append(send_crisis_alert.s(
+                str(user_id), risk_level, contact.email,
+                contact.emergency_contact_name, contact.emergency_contact_phone
+            ))
+        else:
+            signatures.append(send_crisis_alert.s(str(user_id), risk_level))
+    
+    try:
+        queued = group(signatures).apply_async()
+    except Exception as e:
+        logger.error(f"Failed to queue {len(signatures)} crisis alerts: {str(e)}")
+        raise
+    return [
+        {"user_id": str(user_id), "risk_level": risk_level, "task_id": result.id}
+        for (user_id, risk_level), result in zip(flagged, queued.results)
+    ]
+
+@task_with_retry(max_retries=3, ignore_result=True, exponential_backoff=300)
 def check_all_users_crisis_indicators(self) -> Dict[str, Any]:
     """
     Check crisis indicators for all active users.
     This is the periodic task that runs every 15 minutes.
+    
+    The per-user statistics are aggregated in SQL across all users at once;
+    only users that score high or critical fan out to send_crisis_alert.
     """
     try:
         logger.info("Starting crisis detection scan for all users")
         
         with get_db_context() as db:
-            # Get all active users
-            active_users = db.query(User).filter(User.is_active == True).all()
+            cutoff = datetime.utcnow() - timedelta(hours=24)
+            
+            # The three per-user streams below are all ordered by user_id and read in
+            # batches, then merged so each user is assessed as soon as their rows are
+            # in; memory stays bounded by the batch size, not the number of users
+            # Emotion counts per active user
+            emotion_stats = db.query(
+                EmotionRecord.user_id,
+                func.count().label('emotion_count'),
+                func.sum(case((EmotionRecord.emotion.in_(NEGATIVE_EMOTIONS), 1), else_=0)).label('negative_count'),
+                func.max(case((and_(
+                    EmotionRecord.confidence > 0.8,
+                    EmotionRecord.emotion.in_(EXTREME_EMOTIONS)
+                ), 1), else_=0)).label('has_extreme'),
+            ).join(User, User.id == EmotionRecord.user_id).filter(
+                User.is_active == True,
+                EmotionRecord.created_at >= cutoff
+            ).group_by(EmotionRecord.user_id).order_by(EmotionRecord.user_id).yield_per(CRISIS_SCAN_BATCH_SIZE)
+            
+            # Confidences of each user's three newest records, newest first
+            ranked = db.query(
+                EmotionRecord.user_id,
+                EmotionRecord.confidence,
+                func.row_number().over(
+                    partition_by=EmotionRecord.user_id,
+                    order_by=EmotionRecord.created_at.desc()
+                ).label('rn'),
+            ).filter(EmotionRecord.created_at >= cutoff).subquery()
+            recent_confidences = db.query(ranked.c.user_id, ranked.c.confidence).filter(
+                ranked.c.rn <= 3
+            ).order_by(ranked.c.user_id, ranked.c.rn).yield_per(CRISIS_SCAN_BATCH_SIZE)
+            
+            # Unresolved alerts per active user
+            alert_counts = db.query(CrisisAlert.user_id, func.count()).join(
+                User, User.id == CrisisAlert.user_id
+            ).filter(
+                User.is_active == True,
+                CrisisAlert.created_at >= cutoff,
+                CrisisAlert.resolved_at.is_(None)
+            ).group_by(CrisisAlert.user_id).order_by(CrisisAlert.user_id).yield_per(CRISIS_SCAN_BATCH_SIZE)
             
+            rows = heapq.merge(
+                ((row.user_id, "stats", row) for row in emotion_stats),
+                ((user_id, "confidence", confidence) for user_id, confidence in recent_confidences),
+                ((user_id, "alerts", count) for user_id, count in alert_counts),
+                key=itemgetter(0),
+            )
+            users_checked = 0
+            flagged = []
             results = []
-            for user in active_users:
-                try:
-                    result = check_user_crisis_indicators.delay(str(user.id))
-                    results.append({"user_id": str(user.id), "task_id": result.id})
-                except Exception as e:
-                    logger.error(f"Failed to queue crisis check for user {user.id}: {str(e)}")
-            
-            logger.info(f"Crisis detection scan queued for {len(results)} users")
+            for user_id, user_rows in groupby(rows, key=itemgetter(0)):
+                stats, confidences, unresolved_alerts = None, [], 0
+                for _, kind, value in user_rows:
+                    if kind == "stats":
+                        stats = value
+                    elif kind == "confidence":
+                        confidences.append(value)
+                    else:
+                        unresolved_alerts = value
+                # Recent confidences alone (an inactive user) are not a candidate
+                if stats is None and not unresolved_alerts:
+                    continue
+                
+                users_checked += 1
+                assessment = assess_crisis_risk(
+                    emotion_count=stats.emotion_count if stats else 0,
+                    negative_count=stats.negative_count if stats else 0,
+                    has_extreme=bool(stats and stats.has_extreme),
+                    recent_confidences=confidences,
+                    unresolved_alerts=unresolved_alerts,
+                )
+                if assessment["risk_level"] in ["high", "critical"]:
+                    flagged.append((user_id, assessment["risk_level"]))
+                    if len(flagged) >= CRISIS_SCAN_BATCH_SIZE:
+                        results += _queue_crisis_alerts(db, flagged)
+                        flagged = []
+            if flagged:
+                results += _queue_crisis_alerts(db, flagged)
+            
+            logger.info(f"Crisis detection scan checked {users_checked} users, {len(results)} alerts queued")
             return {
                 "status": "completed",
-                "users_checked": len(results),
+                "users_checked": users_checked,
                 "results": results,
                 "timestamp": datetime.utcnow().isoformat()
             }
             
     except Exception as exc:
         logger.error(f"Error in crisis detection scan: {str(exc)}")
-        raise self.retry(countdown=300, exc=exc)  # Retry in 5 minutes
+        raise
 
-@task_with_retry(max_retries=3)
-def send_crisis_alert(self, user_id: str, risk_level: str) -> Dict[str, Any]:
+@task_with_retry(max_retries=3, ignore_result=True, exponential_backoff=30)
+def send_crisis_alert(
+    self,
+    user_id: str,
+    risk_level: str,
+    email: Optional[str] = None,
+    emergency_name: Optional[str] = None,
+    emergency_phone: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Send crisis alert for a user.
     
     Args:
         user_id: UUID string of the user
         risk_level: Risk level (low, medium, high, critical)
+        email: User's email, as already loaded by the caller
+        emergency_name: Emergency contact name, if any
+        emergency_phone: Emergency contact phone, if any
+    
+    When email is not given the contact details are looked up by user_id.
     """
     try:
         logger.info(f"Sending crisis alert for user {user_id} with risk level: {risk_level}")
         
         with get_db_context() as db:
-            # Create crisis alert record
-            alert = CrisisAlert(
-                id=uuid.uuid4(),
+            # Create crisis alert record with a Core insert; nothing reads the
+            # row back, so there is no need for an ORM object and flush
+            alert_id = uuid7()
+            db.execute(insert(CrisisAlert).values(
+                id=alert_id,
                 user_id=user_id,
                 risk_level=risk_level,
                 prediction_confidence=0.8,  # Default confidence
                 triggers=["automated_crisis_detection"],
                 created_at=datetime.utcnow()
-            )
-            
-            db.add(alert)
+            ))
             db.commit()
             
-            # Get user details
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                logger.warning(f"User not found for crisis alert: {user_id}")
-                return {"error": "User not found"}
+            # Get user details unless the caller already passed them
+            if email is None:
+                user = db.query(
+                    User.email, User.emergency_contact_name, User.emergency_contact_phone
+                ).filter(User.id == user_id).first()
+                if not user:
+                    logger.warning(f"User not found for crisis alert: {user_id}")
+                    return {"error": "User not found"}
+                email, emergency_name, emergency_phone = user
             
             # TODO: Implement actual alert sending (email, SMS, push notification)
             # For now, just log the alert
-            logger.critical(f"CRISIS ALERT: User {user.email} has {risk_level} risk level")
+            logger.critical(f"CRISIS ALERT: User {email} has {risk_level} risk level")
             
             # If critical, also log to emergency contact
-            if risk_level == "critical" and user.emergency_contact_name:
-                logger.critical(f"EMERGENCY CONTACT: {user.emergency_contact_name} - {user.emergency_contact_phone}")
+            if risk_level == "critical" and emergency_name:
+                logger.critical(f"EMERGENCY CONTACT: {emergency_name} - {emergency_phone}")
             
             return {
                 "status": "alert_sent",
                 "user_id": user_id,
                 "risk_level": risk_level,
-                "alert_id": str(alert.id),
+                "alert_id": str(alert_id),
                 "timestamp": datetime.utcnow().isoformat()
             }
             
     except Exception as exc:
         logger.error(f"Error sending crisis alert for user {user_id}: {str(exc)}")
-        raise self.retry(countdown=30, exc=exc)
+        raise
 
 # ============================================================================
 # MAINTENANCE TASKS
 # ============================================================================
 
-@task_with_retry(max_retries=3)
+EMOTION_PARTITION_NAME = re.compile(r"^emotion_records_(\d{4})m(\d{2})$")
+
+def _emotion_records_partitioned(db) -> bool:
+    """
+    True when emotion_records is a partitioned table. Only the migrations partition
+    it; a PostgreSQL schema built by init_db() (create_all) has a plain table.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('emotion_records'))"
+    )).scalar()
+
+def _drop_expired_emotion_partitions(db, cutoff: date) -> List[str]:
+    """Drop the monthly emotion_records partitions that end on or before `cutoff`."""
+    partitions = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'emotion_records'::regclass"
+    )).scalars().all()
+    expired = []
+    for name in partitions:
+        match = EMOTION_PARTITION_NAME.match(name)
+        if match is None:
+            continue  # the default partition
+        year, month = int(match.group(1)), int(match.group(2))
+        month_end = date(year + month // 12, month % 12 + 1, 1)
+        if month_end <= cutoff:
+            expired.append(name)
+    for name in sorted(expired):
+        db.execute(text(f"DROP TABLE {name}"))
+    return sorted(expired)
+
+@task_with_retry(max_retries=3, ignore_result=True, exponential_backoff=3600, backoff_max=3600)
+def maintain_emotion_partitions(self) -> Dict[str, Any]:
+    """
+    Create the emotion_records monthly partitions for this month and the next few.
+    Runs daily at 1 AM; a no-op when emotion_records is not partitioned
+    (SQLite, or a PostgreSQL schema built by create_all).
+    """
+    try:
+        with get_db_context() as db:
+            if not _emotion_records_partitioned(db):
+                return {"partitions": [], "skipped": "emotion_records not partitioned"}
+            months = emotion_partition_months(datetime.utcnow().date())
+            db.execute(text(";\n".join(emotion_partition_ddl(month) for month in months)))
+        
+        partitions = [month.isoformat() for month in months]
+        logger.info(f"Emotion record partitions ensured for months: {partitions}")
+        return {"partitions": partitions}
+        
+    except Exception as exc:
+        logger.error(f"Error maintaining emotion record partitions: {str(exc)}")
+        raise
+
+@task_with_retry(max_retries=3, ignore_result=True, exponential_backoff=3600, backoff_max=3600)
 def cleanup_expired_sessions(self) -> Dict[str, Any]:
     """
     Clean up expired sessions and old data.
@@ -300,41 +593,40 @@ def cleanup_expired_sessions(self) -> Dict[str, Any]:
         logger.info("Starting cleanup of expired sessions")
         
         with get_db_context() as db:
+            # One bulk DELETE per table, committed together; nothing is loaded into the session
             # Clean up old peer connections (older than 30 days)
             cutoff_date = datetime.utcnow() - timedelta(days=30)
-            old_connections = db.query(PeerConnection).filter(
+            connections_removed = db.query(PeerConnection).filter(
                 PeerConnection.created_at < cutoff_date,
                 PeerConnection.status.in_(['completed', 'blocked'])
-            ).all()
-            
-            for connection in old_connections:
-                db.delete(connection)
+            ).delete(synchronize_session=False)
             
             # Clean up old emotion records (older than 90 days)
             emotion_cutoff = datetime.utcnow() - timedelta(days=90)
-            old_emotions = db.query(EmotionRecord).filter(
+            partitions_dropped = []
+            if _emotion_records_partitioned(db):
+                # Whole months past the cutoff go with a DROP instead of a row DELETE
+                partitions_dropped = _drop_expired_emotion_partitions(db, emotion_cutoff.date())
+            # The rest of the expired rows (the boundary month and the default partition;
+            # partition pruning skips the others) still have to go for the 90-day rule
+            emotions_removed = db.query(EmotionRecord).filter(
                 EmotionRecord.created_at < emotion_cutoff
-            ).all()
-            
-            for emotion in old_emotions:
-                db.delete(emotion)
+            ).delete(synchronize_session=False)
             
             # Clean up resolved crisis alerts (older than 30 days)
             alert_cutoff = datetime.utcnow() - timedelta(days=30)
-            old_alerts = db.query(CrisisAlert).filter(
+            alerts_removed = db.query(CrisisAlert).filter(
                 CrisisAlert.resolved_at.isnot(None),
                 CrisisAlert.resolved_at < alert_cutoff
-            ).all()
-            
-            for alert in old_alerts:
-                db.delete(alert)
+            ).delete(synchronize_session=False)
             
             db.commit()
             
             cleanup_stats = {
-                "peer_connections_removed": len(old_connections),
-                "emotion_records_removed": len(old_emotions),
-                "crisis_alerts_removed": len(old_alerts),
+                "peer_connections_removed": connections_removed,
+                "emotion_records_removed": emotions_removed,
+                "emotion_partitions_dropped": partitions_dropped,
+                "crisis_alerts_removed": alerts_removed,
                 "cleanup_date": datetime.utcnow().isoformat()
             }
             
@@ -343,9 +635,9 @@ def cleanup_expired_sessions(self) -> Dict[str, Any]:
             
     except Exception as exc:
         logger.error(f"Error during cleanup: {str(exc)}")
-        raise self.retry(countdown=3600, exc=exc)  # Retry in 1 hour
+        raise
 
-@task_with_retry(max_retries=3)
+@task_with_retry(max_retries=3, ignore_result=True, exponential_backoff=3600, backoff_max=3600)
 def database_backup(self) -> Dict[str, Any]:
     """
     Create database backup.
@@ -354,9 +646,13 @@ def database_backup(self) -> Dict[str, Any]:
     try:
         logger.info("Starting database backup")
         
-        # Check database connection
-        if not check_db_connection():
-            raise Exception("Database connection failed")
+        # Check database connection with a pooled SELECT 1; the full
+        # check_db_connection() health check is more than a backup needs
+        try:
+            with get_db_context() as db:
+                db.execute(text("SELECT 1"))
+        except SQLAlchemyError as e:
+            raise DatabaseUnavailable(f"Database connection failed: {str(e)}") from e
         
         # For SQLite, we can create a simple file copy
         # For PostgreSQL, you would typically use pg_dump
@@ -372,71 +668,81 @@ def database_backup(self) -> Dict[str, Any]:
         
     except Exception as exc:
         logger.error(f"Error during database backup: {str(exc)}")
-        raise self.retry(countdown=3600, exc=exc)  # Retry in 1 hour
+        raise
 
 # ============================================================================
 # ANALYTICS TASKS
 # ============================================================================
 
-@task_with_retry(max_retries=3)
+METRICS_CACHE_TTL = 600  # seconds; metrics are reused within each 10-minute bucket
+
+def _metrics_cache():
+    """Redis client of the Celery result backend, or None for other backends."""
+    return getattr(celery_app.backend, 'client', None)
+
+@task_with_retry(max_retries=3, exponential_backoff=1800, backoff_max=1800)
 def generate_daily_metrics(self) -> Dict[str, Any]:
     """
     Generate user engagement and system metrics.
-    Runs hourly.
+    Runs hourly; results are cached in Redis for METRICS_CACHE_TTL seconds.
     """
     try:
         logger.info("Generating daily metrics")
         
+        cache = _metrics_cache()
+        cache_key = f"metrics:hourly:{int(time.time()) // METRICS_CACHE_TTL}"
+        if cache is not None:
+            try:
+                cached = cache.get(cache_key)
+                if cached:
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning(f"Metrics cache read failed: {str(e)}")
+        
         with get_db_context() as db:
             # Get current time boundaries
             now = datetime.utcnow()
             hour_ago = now - timedelta(hours=1)
             day_ago = now - timedelta(days=1)
             
-            # User engagement metrics
-            active_users_hour = db.query(User).filter(
-                User.is_active == True,
-                User.updated_at >= hour_ago
-            ).count()
-            
-            active_users_day = db.query(User).filter(
-                User.is_active == True,
-                User.updated_at >= day_ago
-            ).count()
-            
-            # Emotion tracking metrics
-            emotions_hour = db.query(EmotionRecord).filter(
-                EmotionRecord.created_at >= hour_ago
-            ).count()
-            
-            emotions_day = db.query(EmotionRecord).filter(
-                EmotionRecord.created_at >= day_ago
-            ).count()
-            
-            # Crisis alert metrics
-            alerts_hour = db.query(CrisisAlert).filter(
-                CrisisAlert.created_at >= hour_ago
-            ).count()
-            
-            alerts_day = db.query(CrisisAlert).filter(
-                CrisisAlert.created_at >= day_ago
-            ).count()
-            
-            # Chat activity metrics
-            messages_hour = db.query(ChatMessage).filter(
-                ChatMessage.created_at >= hour_ago
-            ).count()
-            
-            messages_day = db.query(ChatMessage).filter(
-                ChatMessage.created_at >= day_ago
-            ).count()
+            # Hour and day counts for every table in one UNION ALL round trip;
+            # each branch scans the day window once and FILTERs the last hour
+            def window_counts(label, timestamp, *conditions, counted=None):
+                count = func.count(counted) if counted is not None else func.count()
+                return select(
+                    literal(label).label('metric'),
+                    count.filter(timestamp >= hour_ago).label('hour_count'),
+                    count.label('day_count'),
+                ).where(timestamp >= day_ago, *conditions)
+            
+            counts = {
+                row.metric: row for row in db.execute(union_all(
+                    window_counts('users', User.updated_at, User.is_active == True),
+                    window_counts('emotions', EmotionRecord.created_at),
+                    # Users who recorded an emotion; served by the emotion_records
+                    # created_at index rather than a scan of users
+                    window_counts('emotion_users', EmotionRecord.created_at,
+                                  counted=distinct(EmotionRecord.user_id)),
+                    window_counts('alerts', CrisisAlert.created_at),
+                    window_counts('messages', ChatMessage.created_at),
+                ))
+            }
+            active_users_hour, active_users_day = counts['users'].hour_count, counts['users'].day_count
+            emotions_hour, emotions_day = counts['emotions'].hour_count, counts['emotions'].day_count
+            emotion_users_hour, emotion_users_day = counts['emotion_users'].hour_count, counts['emotion_users'].day_count
+            alerts_hour, alerts_day = counts['alerts'].hour_count, counts['alerts'].day_count
+            messages_hour, messages_day = counts['messages'].hour_count, counts['messages'].day_count
             
             metrics = {
                 "timestamp": now.isoformat(),
                 "period": "hourly",
                 "user_engagement": {
+                    # Active users whose row was updated in the window
                     "active_users_hour": active_users_hour,
-                    "active_users_day": active_users_day
+                    "active_users_day": active_users_day,
+                    # Users who recorded at least one emotion in the window
+                    "users_active_by_emotion_hour": emotion_users_hour,
+                    "users_active_by_emotion_day": emotion_users_day
                 },
                 "emotion_tracking": {
                     "emotions_recorded_hour": emotions_hour,
@@ -453,16 +759,39 @@ def generate_daily_metrics(self) -> Dict[str, Any]:
             }
             
             logger.info(f"Metrics generated: {metrics}")
+            if cache is not None:
+                try:
+                    cache.setex(cache_key, METRICS_CACHE_TTL, json.dumps(metrics))
+                except Exception as e:
+                    logger.warning(f"Metrics cache write failed: {str(e)}")
             return metrics
             
     except Exception as exc:
         logger.error(f"Error generating metrics: {str(exc)}")
-        raise self.retry(countdown=1800, exc=exc)  # Retry in 30 minutes
+        raise
 
 # ============================================================================
 # AI TASKS
 # ============================================================================
 
+def _generate_ai_responses(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run inference for a batch of {session_id, prompt} items in one call."""
+    # Generate mock AI responses; a real model takes the whole batch at once
+    responses = [
+        f"AI response for session {item['session_id']} with prompt: {item['prompt']}"
+        for item in items
+    ]
+    timestamp = datetime.utcnow().isoformat()
+    return [
+        {
+            "session_id": item["session_id"],
+            "response": response,
+            "timestamp": timestamp,
+            "status": "completed"
+        }
+        for item, response in zip(items, responses)
+    ]
+
 @celery_app.task(bind=True, max_retries=3, autoretry_for=(Exception,))
 def ai_task(self, session_id: int, prompt: str) -> Dict[str, Any]:
     """
@@ -478,19 +807,7 @@ def ai_task(self, session_id: int, prompt: str) -> Dict[str, Any]:
     try:
         logger.info(f"Processing AI task for session {session_id} with prompt: {prompt[:50]}...")
         
-        # Simulate AI processing work
-        import time
-        time.sleep(1)  # Simulate processing time
-        
-        # Generate mock AI response
-        response = f"AI response for session {session_id} with prompt: {prompt}"
-        
-        result = {
-            "session_id": session_id,
-            "response": response,
-            "timestamp": datetime.utcnow().isoformat(),
-            "status": "completed"
-        }
+        result = _generate_ai_responses([{"session_id": session_id, "prompt": prompt}])[0]
         
         logger.info(f"AI task completed for session {session_id}")
         return result
@@ -501,6 +818,26 @@ def ai_task(self, session_id: int, prompt: str) -> Dict[str, Any]:
         retry_delay = 2 ** self.request.retries
         raise self.retry(countdown=retry_delay, exc=exc)
 
+@celery_app.task(bind=True, max_retries=3, autoretry_for=(Exception,))
+def ai_task_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Batched variant of ai_task.
+    
+    Args:
+        items: List of {"session_id": ..., "prompt": ...} dicts
+        
+    Returns:
+        List of results in the same order as items
+    """
+    try:
+        logger.info(f"Processing batched AI task with {len(items)} prompts")
+        return _generate_ai_responses(items)
+        
+    except Exception as exc:
+        logger.error(f"Error in batched AI task: {str(exc)}")
+        retry_delay = 2 ** self.request.retries
+        raise self.retry(countdown=retry_delay, exc=exc)
+
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
@@ -511,11 +848,13 @@ def get_celery_app() -> Celery:
 
 def start_worker():
     """Start Celery worker (for development)."""
-    celery_app.worker_main(['worker', '--loglevel=info'])
+    celery_app.worker_main([
+        'worker', '--loglevel=info', '-O', 'fair', '--prefetch-multiplier=1',
+        '-Q', 'celery,crisis,alerts,maintenance,analytics,transient',
+    ])
 
 def start_beat():
     """Start Celery Beat scheduler (for development)."""
-    celery_app.control.purge()  # Clear any existing tasks
     celery_app.start(['beat', '--loglevel=info'])
 
 # ============================================================================
@@ -3,58 +3,84 @@ Configuration management using Pydantic BaseSettings with .env support.
 """
 
 import os
-from typing import List, Optional
-from pydantic_settings import BaseSettings
-from pydantic import Field
+from functools import lru_cache
+from typing import List, Optional, Union
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field, field_validator
 
 
 class Settings(BaseSettings):
 	# Minimal required
-	PROJECT_NAME: str = Field("MindBridge Backend", env="PROJECT_NAME")
-	API_V1_STR: str = Field("/api", env="API_V1_STR")
-	DATABASE_URL: str = Field("sqlite:///./test.db", env="DATABASE_URL")
-	ML_SERVICE_URL: str = Field("http://localhost:9000", env="ML_SERVICE_URL")
+	PROJECT_NAME: str = "MindBridge Backend"
+	API_V1_STR: str = "/api"
+	DATABASE_URL: str = "sqlite:///./test.db"
+	ML_SERVICE_URL: str = "http://localhost:9000"
 
 	# Existing fields referenced elsewhere
-	SQLITE_URL: str = Field("sqlite:///./dev.db", env="SQLITE_URL")
-	USE_SQLITE_FALLBACK: bool = Field(True, env="USE_SQLITE_FALLBACK")
-	REDIS_URL: str = Field("redis://localhost:6379", env="REDIS_URL")
-	SECRET_KEY: str = Field("changeme", env="SECRET_KEY")
-	ALGORITHM: str = Field("HS256", env="ALGORITHM")
-	ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
-	REFRESH_TOKEN_EXPIRE_DAYS: int = Field(7, env="REFRESH_TOKEN_EXPIRE_DAYS")
-	CELERY_BROKER_URL: str = Field("redis://localhost:6379/0", env="CELERY_BROKER_URL")
-	CELERY_RESULT_BACKEND: str = Field("redis://localhost:6379/0", env="CELERY_RESULT_BACKEND")
-	SOCKETIO_CORS_ALLOWED_ORIGINS: str = Field("http://localhost:3000,http://localhost:8080", env="SOCKETIO_CORS_ALLOWED_ORIGINS")
-	APP_NAME: str = Field("Mind Bridge AI", env="APP_NAME")
-	APP_VERSION: str = Field("1.0.0", env="APP_VERSION")
-	DEBUG: bool = Field(True, env="DEBUG")
-	HOST: str = Field("0.0.0.0", env="HOST")
-	PORT: int = Field(8000, env="PORT")
-	DB_POOL_SIZE: int = Field(10, env="DB_POOL_SIZE")
-	DB_MAX_OVERFLOW: int = Field(20, env="DB_MAX_OVERFLOW")
-	DB_POOL_TIMEOUT: int = Field(30, env="DB_POOL_TIMEOUT")
-	DB_POOL_RECYCLE: int = Field(1800, env="DB_POOL_RECYCLE")
-	CORS_ORIGINS: List[str] = Field(default_factory=lambda: ["http://localhost:3000", "http://localhost:8080", "http://127.0.0.1:3000"], env="CORS_ORIGINS")
-	MAX_FILE_SIZE: int = Field(10 * 1024 * 1024, env="MAX_FILE_SIZE")
-	UPLOAD_DIR: str = Field("uploads", env="UPLOAD_DIR")
-	LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
-	LOG_FILE: Optional[str] = Field(default=None, env="LOG_FILE")
-	BCRYPT_ROUNDS: int = Field(12, env="BCRYPT_ROUNDS")
-	RATE_LIMIT_REQUESTS: int = Field(100, env="RATE_LIMIT_REQUESTS")
-	RATE_LIMIT_WINDOW: int = Field(60, env="RATE_LIMIT_WINDOW")
-	LOGIN_RATE_LIMIT_REQUESTS: int = Field(5, env="LOGIN_RATE_LIMIT_REQUESTS")
-	LOGIN_RATE_LIMIT_WINDOW: int = Field(60, env="LOGIN_RATE_LIMIT_WINDOW")
-
-	class Config:
-		env_file = ".env"
-		env_file_encoding = "utf-8"
-
-
-settings = Settings()
-
-# Ensure upload directory exists
-try:
-	os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-except Exception:
-	pass
+	SQLITE_URL: str = "sqlite:///./dev.db"
+	USE_SQLITE_FALLBACK: bool = True
+	REDIS_URL: str = "redis://localhost:6379"
+	SECRET_KEY: str = "changeme"
+	ALGORITHM: str = "HS256"
+	# PEM key pair, only used for RS*/ES*/PS* algorithms
+	JWT_PRIVATE_KEY: Optional[str] = None
+	JWT_PUBLIC_KEY: Optional[str] = None
+	ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+	REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+	CELERY_BROKER_URL: str = "redis://localhost:6379/0"
+	CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
+	SOCKETIO_CORS_ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:8080"
+	APP_NAME: str = "Mind Bridge AI"
+	APP_VERSION: str = "1.0.0"
+	DEBUG: bool = True
+	HOST: str = "0.0.0.0"
+	PORT: int = 8000
+	DB_POOL_SIZE: int = 10
+	DB_MAX_OVERFLOW: int = 20
+	DB_POOL_TIMEOUT: int = 30
+	DB_POOL_RECYCLE: int = 1800
+	# Union with str lets a comma-separated env value (as in env.example) reach the validator instead of failing the JSON decode
+	CORS_ORIGINS: Union[List[str], str] = Field(default_factory=lambda: ["http://localhost:3000", "http://localhost:8080", "http://127.0.0.1:3000"])
+	MAX_FILE_SIZE: int = 10 * 1024 * 1024
+	UPLOAD_DIR: str = "uploads"
+	LOG_LEVEL: str = "INFO"
+	LOG_FILE: Optional[str] = None
+	BCRYPT_ROUNDS: int = 12
+	BCRYPT_USE_PROCESS_POOL: bool = False
+	RATE_LIMIT_REQUESTS: int = 100
+	RATE_LIMIT_WINDOW: int = 60
+	LOGIN_RATE_LIMIT_REQUESTS: int = 5
+	LOGIN_RATE_LIMIT_WINDOW: int = 60
+	# Web worker processes (the uvicorn/gunicorn WEB_CONCURRENCY convention); the
+	# rate limiter splits its unsynced local allowance between them
+	WEB_CONCURRENCY: int = 1
+
+	@field_validator("CORS_ORIGINS", mode="before")
+	@classmethod
+	def split_cors_origins(cls, v):
+		"""Parse a comma-separated CORS_ORIGINS once at load time."""
+		if isinstance(v, str):
+			return [origin.strip() for origin in v.split(",") if origin.strip()]
+		return v
+
+	# Field names double as environment variable names
+	model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", case_sensitive=False)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+	"""Build the settings once and return the same instance afterwards (usable with Depends)."""
+	settings = Settings()
+
+	# Ensure upload directory exists
+	try:
+		os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+	except Exception:
+		pass
+
+	return settings
+
+
+# Every module reads settings at import (engines, clients, app config), so the
+# shared instance is simply built here; get_settings() returns this same object
+settings = get_settings()
@@ -5,12 +5,16 @@ Supports PostgreSQL with SQLite fallback, connection pooling, retry logic, and h
 
 import os
 import time
+import socket
 import logging
-from typing import Generator, Dict, Any, Optional
+import importlib
+from functools import lru_cache
+from typing import Generator, Dict, Any, Optional, Tuple
 from contextlib import contextmanager
-from urllib.parse import urlparse
 
-from sqlalchemy import create_engine, event, text, inspect
+import orjson
+
+from sqlalchemy import create_engine, event, text, inspect, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.orm import Session
 from sqlalchemy.pool import QueuePool, StaticPool
@@ -23,14 +27,17 @@ from sqlalchemy.engine import Engine
 
 from config import settings
 
-# Configure logging
-logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
 # Database configuration constants
 MAX_RETRIES = 3
 RETRY_DELAY_BASE = 2
 HEALTH_CHECK_TIMEOUT = 5
+TCP_PROBE_TIMEOUT = 0.2  # seconds; reachability check before a full PostgreSQL connect
+
+def orjson_serializer(value: Any) -> str:
+    """Serialize JSON/JSONB column values with orjson instead of the stdlib encoder."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
 
 # Database engine configuration for PostgreSQL
 postgresql_engine_kwargs = {
@@ -41,6 +48,8 @@ postgresql_engine_kwargs = {
     "pool_recycle": settings.DB_POOL_RECYCLE,
     "pool_pre_ping": True,  # Verify connections before use
     "echo": settings.DEBUG,  # Log SQL queries in debug mode
+    "json_serializer": orjson_serializer,
+    "json_deserializer": orjson.loads,
     "connect_args": {
         "connect_timeout": 10,
         "application_name": "mindbridge_ai"
@@ -52,32 +61,70 @@ sqlite_engine_kwargs = {
     "poolclass": StaticPool,
     "pool_pre_ping": False,  # Disable pre-ping for SQLite
     "echo": settings.DEBUG,
+    "json_serializer": orjson_serializer,
+    "json_deserializer": orjson.loads,
     "connect_args": {
         "check_same_thread": False,
         "timeout": 20
     }
 }
 
-def test_database_connection(database_url: str, engine_kwargs: Dict[str, Any]) -> bool:
-    """Test database connection with timeout."""
+# Applied in a single executescript call on every new SQLite connection (mmap_size is 256MB)
+SQLITE_PRAGMAS = """
+PRAGMA foreign_keys=ON;
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA cache_size=1000;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA optimize;
+"""
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLite pragmas to each new connection."""
+    try:
+        dbapi_connection.executescript(SQLITE_PRAGMAS)
+        logger.debug("SQLite pragmas configured")
+    except Exception as e:
+        logger.warning(f"Failed to set SQLite pragmas: {e}")
+
+def connect_engine(database_url: str, engine_kwargs: Dict[str, Any]) -> Engine:
+    """Create the engine and verify it with SELECT 1; the checked connection stays pooled."""
+    engine = create_engine(database_url, **engine_kwargs)
+    # The dialect is fixed per engine, so pick the listener once; it is registered
+    # before the first connect so the pooled check connection is configured too
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
     try:
-        test_engine = create_engine(database_url, **engine_kwargs)
-        with test_engine.connect() as conn:
+        with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
-        test_engine.dispose()
+    except Exception:
+        engine.dispose()
+        raise
+    return engine
+
+def is_server_reachable(database_url: str) -> bool:
+    """Cheap TCP check that the database host accepts connections."""
+    url = make_url(database_url)
+    if not url.host:
+        # Unix-domain socket; nothing to probe over TCP
         return True
-    except Exception as e:
-        logger.debug(f"Connection test failed: {e}")
+    try:
+        with socket.create_connection((url.host, url.port or 5432), timeout=TCP_PROBE_TIMEOUT):
+            return True
+    except OSError as e:
+        logger.debug(f"TCP probe to {url.host}:{url.port or 5432} failed: {e}")
         return False
 
 def create_database_engine() -> Engine:
     """Create database engine with robust retry logic and fallback."""
     logger.info("Initializing database connection...")
     
-    # Check environment variables for database preference
-    database_url = os.getenv("DATABASE_URL", settings.DATABASE_URL)
-    sqlite_url = os.getenv("SQLITE_URL", settings.SQLITE_URL)
-    use_sqlite_fallback = os.getenv("USE_SQLITE_FALLBACK", str(settings.USE_SQLITE_FALLBACK)).lower() == "true"
+    # Settings already reads these from the environment and .env; the only
+    # connection attempts are the ones below
+    database_url = settings.DATABASE_URL
+    sqlite_url = settings.SQLITE_URL
+    use_sqlite_fallback = settings.USE_SQLITE_FALLBACK
     
     # Ensure SQLite URL is not None or empty
     if not sqlite_url or sqlite_url.strip() == "":
@@ -90,12 +137,13 @@ def create_database_engine() -> Engine:
         
         for attempt in range(MAX_RETRIES):
             try:
-                if test_database_connection(database_url, postgresql_engine_kwargs):
-                    engine = create_engine(database_url, **postgresql_engine_kwargs)
-                    logger.info("✅ Successfully connected to PostgreSQL database")
-                    return engine
-                else:
-                    raise OperationalError("PostgreSQL connection test failed", None, None)
+                # Skip the handshake (and its 10s connect_timeout) while the
+                # host is not even accepting TCP connections
+                if not is_server_reachable(database_url):
+                    raise OperationalError("PostgreSQL server is not reachable", None, None)
+                engine = connect_engine(database_url, postgresql_engine_kwargs)
+                logger.info("✅ Successfully connected to PostgreSQL database")
+                return engine
                     
             except Exception as e:
                 retry_delay = RETRY_DELAY_BASE * (2 ** attempt)
@@ -119,12 +167,9 @@ def create_database_engine() -> Engine:
     
     for attempt in range(MAX_RETRIES):
         try:
-            if test_database_connection(sqlite_url, sqlite_engine_kwargs):
-                engine = create_engine(sqlite_url, **sqlite_engine_kwargs)
-                logger.info("✅ Successfully connected to SQLite database")
-                return engine
-            else:
-                raise OperationalError("SQLite connection test failed", None, None)
+            engine = connect_engine(sqlite_url, sqlite_engine_kwargs)
+            logger.info("✅ Successfully connected to SQLite database")
+            return engine
                 
         except Exception as e:
             retry_delay = RETRY_DELAY_BASE * (2 ** attempt)
@@ -148,10 +193,9 @@ def create_database_engine() -> Engine:
                         logger.info(f"Created SQLite database file: {db_path}")
                     
                     # Try one more time
-                    if test_database_connection(sqlite_url, sqlite_engine_kwargs):
-                        engine = create_engine(sqlite_url, **sqlite_engine_kwargs)
-                        logger.info("✅ Successfully connected to SQLite database after file creation")
-                        return engine
+                    engine = connect_engine(sqlite_url, sqlite_engine_kwargs)
+                    logger.info("✅ Successfully connected to SQLite database after file creation")
+                    return engine
                 except Exception as create_error:
                     logger.error(f"Failed to create SQLite database: {create_error}")
                 
@@ -163,46 +207,31 @@ def create_database_engine() -> Engine:
 # Create engine
 engine = create_database_engine()
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection URL with the password hidden, safe to report from health endpoints
+_MASKED_URL = engine.url.render_as_string(hide_password=True)
+
+# Create session factory; objects keep their loaded state after commit, so call
+# db.refresh() where server-generated values are needed
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create declarative base
 Base = declarative_base()
 
 # Connection event listeners for better error handling and monitoring
-@event.listens_for(engine, "connect")
-def set_database_pragmas(dbapi_connection, connection_record):
-    """Set database-specific pragmas and configurations."""
-    if "sqlite" in str(dbapi_connection):
-        # SQLite-specific optimizations
-        cursor = dbapi_connection.cursor()
-        try:
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.execute("PRAGMA journal_mode=WAL")
-            cursor.execute("PRAGMA synchronous=NORMAL")
-            cursor.execute("PRAGMA cache_size=1000")
-            cursor.execute("PRAGMA temp_store=MEMORY")
-            cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
-            cursor.execute("PRAGMA optimize")
-            logger.debug("SQLite pragmas configured")
-        except Exception as e:
-            logger.warning(f"Failed to set SQLite pragmas: {e}")
-        finally:
-            cursor.close()
-    elif "postgresql" in str(dbapi_connection):
-        # PostgreSQL-specific configurations
-        logger.debug("PostgreSQL connection established")
-
-@event.listens_for(engine, "checkout")
 def receive_checkout(dbapi_connection, connection_record, connection_proxy):
     """Handle connection checkout events."""
     logger.debug("Connection checked out from pool")
 
-@event.listens_for(engine, "checkin")
 def receive_checkin(dbapi_connection, connection_record):
     """Handle connection checkin events."""
     logger.debug("Connection checked in to pool")
 
+# Checkout/checkin fire on every request; only hook them when their output is visible
+_DEBUG_POOL = logger.isEnabledFor(logging.DEBUG)
+if _DEBUG_POOL:
+    event.listen(engine, "checkout", receive_checkout)
+    event.listen(engine, "checkin", receive_checkin)
+
 @event.listens_for(engine, "invalidate")
 def receive_invalidate(dbapi_connection, connection_record, exception):
     """Handle connection invalidation events."""
@@ -259,30 +288,31 @@ def get_db_context():
     finally:
         db.close()
 
-@contextmanager
-def get_db_transaction():
-    """
-    Context manager for database transactions.
-    Provides explicit transaction control with rollback on exception.
-    """
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-        logger.debug("Database transaction committed")
-    except Exception as e:
-        logger.error(f"Database error in transaction: {e}")
-        db.rollback()
-        logger.debug("Database transaction rolled back")
-        raise
-    finally:
-        db.close()
+# Same commit/rollback semantics; kept as an alias for existing callers
+get_db_transaction = get_db_context
+
+# Set once the models module has registered its tables on Base.metadata
+_MODELS_LOADED = False
+
+def load_models() -> None:
+    """Import the models module once so its tables are registered on Base.metadata."""
+    global _MODELS_LOADED
+    if not _MODELS_LOADED:
+        importlib.import_module("models")
+        _MODELS_LOADED = True
+
+# Set once create_all has succeeded in this process; reset_database clears it
+_DB_INITIALIZED = False
 
 def init_db():
     """Initialize database tables with comprehensive error handling."""
+    global _DB_INITIALIZED
+    if _DB_INITIALIZED:
+        return True
+    
     try:
-        # Import all models to ensure they are registered
-        from models import User, EmotionRecord, PeerConnection, CrisisAlert, ChatMessage, AIResponse
+        # Tables must be registered before create_all; no-op after the first call
+        load_models()
         
         # For SQLite, ensure the database file exists
         if "sqlite" in str(engine.url):
@@ -304,6 +334,7 @@ def init_db():
             logger.warning(f"Some tables were not created: {missing_tables}")
         
         logger.info(f"✅ Database tables initialized successfully. Created: {len(table_names)} tables")
+        _DB_INITIALIZED = True
         return True
         
     except Exception as e:
@@ -317,7 +348,18 @@ def init_db():
         raise
 
 def check_db_connection() -> bool:
-    """Comprehensive database health check."""
+    """Cheap database health check: a single SELECT 1 on a pooled connection."""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Database health check failed: {e}")
+        return False
+
+def deep_health_check() -> bool:
+    """Comprehensive database health check for startup and detailed diagnostics."""
     try:
         with engine.connect() as conn:
             # Basic connectivity test
@@ -353,9 +395,9 @@ def check_db_connection() -> bool:
             inspector = inspect(engine)
             table_names = inspector.get_table_names()
             if table_names:
-                # Test querying a table
+                # Reading one row proves access without counting the whole table
                 first_table = table_names[0]
-                conn.execute(text(f"SELECT COUNT(*) FROM {first_table} LIMIT 1"))
+                conn.execute(text(f"SELECT 1 FROM {first_table} LIMIT 1"))
                 logger.debug(f"✅ Table access test passed for {first_table}")
         
         logger.debug("✅ Database health check passed")
@@ -365,62 +407,59 @@ def check_db_connection() -> bool:
         logger.error(f"❌ Database health check failed: {e}")
         return False
 
+@lru_cache(maxsize=1)
+def _static_db_info() -> Tuple[str, str, str]:
+    """Database type, server version and masked URL, queried once per process."""
+    with engine.connect() as conn:
+        if "postgresql" in str(engine.url):
+            result = conn.execute(text("SELECT version()")).fetchone()
+            version = result[0] if result else "Unknown"
+            db_type = "PostgreSQL"
+        elif "sqlite" in str(engine.url):
+            result = conn.execute(text("SELECT sqlite_version()")).fetchone()
+            version = result[0] if result else "Unknown"
+            db_type = "SQLite"
+        else:
+            version = "Unknown"
+            db_type = "Unknown"
+    return db_type, version, _MASKED_URL
+
 def get_db_info() -> Dict[str, Any]:
     """Get comprehensive database connection information."""
     try:
-        with engine.connect() as conn:
-            # Get database version
-            if "postgresql" in str(engine.url):
-                result = conn.execute(text("SELECT version()")).fetchone()
-                version = result[0] if result else "Unknown"
-                db_type = "PostgreSQL"
-            elif "sqlite" in str(engine.url):
-                result = conn.execute(text("SELECT sqlite_version()")).fetchone()
-                version = result[0] if result else "Unknown"
-                db_type = "SQLite"
-            else:
-                version = "Unknown"
-                db_type = "Unknown"
-            
-            # Get table count
-            inspector = inspect(engine)
-            table_names = inspector.get_table_names()
-            
-            # Get connection pool info
-            pool = engine.pool
-            pool_info = {
-                "size": getattr(pool, 'size', lambda: 0)(),
-                "checked_in": getattr(pool, 'checkedin', lambda: 0)(),
-                "checked_out": getattr(pool, 'checkedout', lambda: 0)(),
-                "overflow": getattr(pool, 'overflow', lambda: 0)(),
-            }
-            
-            # Mask password in URL
-            url_str = str(engine.url)
-            if engine.url.password:
-                url_str = url_str.replace(engine.url.password, "***")
-            
-            return {
-                "connected": True,
-                "type": db_type,
-                "version": version,
-                "url": url_str,
-                "tables": table_names,
-                "table_count": len(table_names),
-                "pool": pool_info,
-                "timestamp": time.time()
-            }
+        # Failed lookups raise and are not cached, so they are retried next call
+        db_type, version, url_str = _static_db_info()
+        
+        # Get table count
+        inspector = inspect(engine)
+        table_names = inspector.get_table_names()
+        
+        # Get connection pool info
+        pool = engine.pool
+        pool_info = {
+            "size": getattr(pool, 'size', lambda: 0)(),
+            "checked_in": getattr(pool, 'checkedin', lambda: 0)(),
+            "checked_out": getattr(pool, 'checkedout', lambda: 0)(),
+            "overflow": getattr(pool, 'overflow', lambda: 0)(),
+        }
+        
+        return {
+            "connected": True,
+            "type": db_type,
+            "version": version,
+            "url": url_str,
+            "tables": table_names,
+            "table_count": len(table_names),
+            "pool": pool_info,
+            "timestamp": time.time()
+        }
             
     except Exception as e:
-        url_str = str(engine.url)
-        if engine.url.password:
-            url_str = url_str.replace(engine.url.password, "***")
-            
         return {
             "connected": False,
             "type": "Unknown",
             "version": "Unknown",
-            "url": url_str,
+            "url": _MASKED_URL,
             "error": str(e),
             "timestamp": time.time()
         }
@@ -474,11 +513,13 @@ def get_database_stats() -> Dict[str, Any]:
 
 def reset_database():
     """Reset database by dropping and recreating all tables."""
+    global _DB_INITIALIZED
     try:
         logger.warning("⚠️ Resetting database - all data will be lost!")
         
         # Drop all tables
         Base.metadata.drop_all(bind=engine)
+        _DB_INITIALIZED = False
         logger.info("All tables dropped")
         
         # Recreate all tables
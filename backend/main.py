@@ -3,35 +3,24 @@ Main FastAPI application with Socket.IO integration.
 Entry point for the Mind Bridge AI backend service.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, status, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import logging
+import anyio
 import uvicorn
 import time
 import httpx
 from datetime import datetime
+from typing import Any, Dict, Tuple
 import os
 
 from config import settings
-from database import init_db, check_db_connection, get_db_info
-from socketio_events import sio as legacy_sio
-try:
-    from websockets_local import sio as new_sio, get_redis as get_redis_client
-    sio = new_sio
-except Exception:
-    sio = legacy_sio
-    get_redis_client = None
-from auth import (
-    get_current_active_user, User, router as auth_router,
-    SecurityMiddleware, RateLimitMiddleware
-)
-from celery_app import celery_app, health_check
 
-# Configure logging
+# Configure logging before importing modules that log at import time (database engine setup)
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -42,6 +31,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+from database import init_db, check_db_connection, deep_health_check, get_db_info, get_db_context
+from models import ChatMessage
+from socketio_events import sio as legacy_sio
+try:
+    from websockets_local import sio as new_sio, get_redis as get_redis_client
+    sio = new_sio
+except Exception:
+    sio = legacy_sio
+    get_redis_client = None
+from auth import (
+    get_current_active_user, CurrentUser, router as auth_router,
+    RateLimitMiddleware, init_redis as init_auth_redis
+)
+from celery_app import celery_app, health_check
+
 # Application lifespan management
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -49,6 +53,9 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Mind Bridge AI application...")
     
+    # Widen the thread pool that runs sync dependencies and endpoints
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 64
+    
     # Initialize database
     try:
         init_db()
@@ -58,7 +65,7 @@ async def lifespan(app: FastAPI):
         raise
     
     # Check database connection
-    if not check_db_connection():
+    if not deep_health_check():
         logger.error("Database connection check failed")
         raise Exception("Database connection failed")
     
@@ -73,6 +80,9 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Celery connection test failed: {e}")
     
+    # Connect the auth module's Redis client (rate limiting, token blacklist)
+    await init_auth_redis()
+    
     # Probe Redis (if available)
     if get_redis_client is not None:
         try:
@@ -82,6 +92,9 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"Redis initialization failed: {e}")
 
+    # Open the shared ML service client on the running loop
+    ml_client.open()
+    
     # Probe ML service
     try:
         async with httpx.AsyncClient(timeout=2.0) as client:
@@ -106,6 +119,11 @@ async def lifespan(app: FastAPI):
             await r.aclose()
     except Exception:
         pass
+    # Close pooled ML service connections
+    try:
+        await ml_client.aclose()
+    except Exception:
+        pass
     logger.info("Application shutdown completed")
 
 # Create FastAPI application
@@ -115,6 +133,7 @@ app = FastAPI(
     description="AI-powered mental health and wellness platform",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -127,20 +146,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add trusted host middleware
-app.add_middleware(
-    TrustedHostMiddleware,
-    allowed_hosts=["*"] if settings.DEBUG else ["localhost", "127.0.0.1"]
-)
-
-# Add security middleware
-app.add_middleware(SecurityMiddleware)
+# Add trusted host middleware; with a wildcard it would accept every host, so skip the layer
+if not settings.DEBUG:
+    app.add_middleware(
+        TrustedHostMiddleware,
+        allowed_hosts=["localhost", "127.0.0.1"]
+    )
 
 # Add rate limiting middleware
 app.add_middleware(
     RateLimitMiddleware,
     calls=settings.RATE_LIMIT_REQUESTS,
-    period=settings.RATE_LIMIT_WINDOW
+    period=settings.RATE_LIMIT_WINDOW,
+    workers=settings.WEB_CONCURRENCY
 )
 
 # Request logging and basic metrics
@@ -150,20 +168,33 @@ metrics = {
     "http_request_duration_seconds_sum": 0.0,
 }
 
-@app.middleware("http")
-async def logging_middleware(request: Request, call_next):
-    start = time.perf_counter()
-    try:
-        response: Response = await call_next(request)
-        return response
-    except Exception as e:
-        metrics["http_errors_total"] += 1
-        logger.exception(f"Unhandled request error: {e}")
-        raise
-    finally:
-        duration = time.perf_counter() - start
-        metrics["http_requests_total"] += 1
-        metrics["http_request_duration_seconds_sum"] += duration
+class RequestMetricsMiddleware:
+    """
+    Request counting and timing as plain ASGI middleware.
+    Unlike @app.middleware("http"), no Request/Response wrappers or extra task
+    are created per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        except Exception as e:
+            metrics["http_errors_total"] += 1
+            logger.exception(f"Unhandled request error: {e}")
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            metrics["http_requests_total"] += 1
+            metrics["http_request_duration_seconds_sum"] += duration
+
+app.add_middleware(RequestMetricsMiddleware)
 
 # Mount static files
 if os.path.exists(settings.UPLOAD_DIR):
@@ -178,7 +209,7 @@ except Exception as e:
     logger.warning(f"Simple auth router not loaded: {e}")
 
 # Include ML service router
-from ml_service import router as ml_router
+from ml_service import router as ml_router, ml_client
 app.include_router(ml_router)
 
 # Socket.IO integration
@@ -187,12 +218,25 @@ from socketio import ASGIApp
 sio_app = ASGIApp(sio, app)
 logger.info("Socket.IO ASGI integration initialized and mounted")
 
+# Health probes arrive every second or so per pod; answer them from a recent DB check
+HEALTH_CACHE_TTL = 1.0  # seconds
+_health_cache: Dict[bool, Tuple[float, bool, Dict[str, Any]]] = {}
+
+async def cached_db_status(deep: bool = False) -> Tuple[bool, Dict[str, Any]]:
+    """Return (connected, info) from the last check within HEALTH_CACHE_TTL, else re-check off the event loop."""
+    cached = _health_cache.get(deep)
+    if cached is not None and time.monotonic() - cached[0] < HEALTH_CACHE_TTL:
+        return cached[1], cached[2]
+    db_connected = await anyio.to_thread.run_sync(deep_health_check if deep else check_db_connection)
+    db_info = await anyio.to_thread.run_sync(get_db_info)
+    _health_cache[deep] = (time.monotonic(), db_connected, db_info)
+    return db_connected, db_info
+
 # Health check endpoints
 @app.get("/health")
 async def health_check_endpoint():
     """Health check endpoint."""
-    db_connected = check_db_connection()
-    db_info = get_db_info()
+    db_connected, db_info = await cached_db_status()
     # Redis
     redis_connected = False
     if get_redis_client is not None:
@@ -213,7 +257,7 @@ async def health_check_endpoint():
 
     return {
         "status": "healthy" if db_connected else "unhealthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.utcnow(),
         "version": settings.APP_VERSION,
         "database": db_info,
         "services": {
@@ -227,8 +271,7 @@ async def health_check_endpoint():
 @app.get("/health/detailed")
 async def detailed_health_check():
     """Detailed health check with service status."""
-    db_connected = check_db_connection()
-    db_info = get_db_info()
+    db_connected, db_info = await cached_db_status(deep=True)
     
     # Test Celery
     celery_status = "unknown"
@@ -240,7 +283,7 @@ async def detailed_health_check():
     
     return {
         "status": "healthy" if db_connected else "unhealthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.utcnow(),
         "version": settings.APP_VERSION,
         "environment": {
             "debug": settings.DEBUG,
@@ -296,7 +339,7 @@ async def root():
     }
 
 @app.get("/api/v1/status")
-async def api_status(current_user: User = Depends(get_current_active_user)):
+async def api_status(current_user: CurrentUser = Depends(get_current_active_user)):
     """API status endpoint requiring authentication."""
     return {
         "status": "active",
@@ -304,25 +347,22 @@ async def api_status(current_user: User = Depends(get_current_active_user)):
             "id": str(current_user.id),
             "email": current_user.email
         },
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow()
     }
 
 # User endpoints
 @app.get("/api/v1/users/me")
-async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: CurrentUser = Depends(get_current_active_user)):
     """Get current user information."""
     return {
         "user": current_user.to_dict(),
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow()
     }
 
 # Chat message endpoints
 @app.get("/api/v1/messages")
-async def get_user_messages(current_user: User = Depends(get_current_active_user)):
+async def get_user_messages(current_user: CurrentUser = Depends(get_current_active_user)):
     """Get user's chat messages."""
-    from database import get_db_context
-    from models import ChatMessage
-    
     with get_db_context() as db:
         messages = db.query(ChatMessage).filter(
             (ChatMessage.sender_id == current_user.id) | 
@@ -332,32 +372,35 @@ async def get_user_messages(current_user: User = Depends(get_current_active_user
         return {
             "messages": [message.to_dict() for message in messages],
             "count": len(messages),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
-# Error handlers
+# Error handlers; Starlette runs the HTTPException handler from its ExceptionMiddleware
+# and the Exception handler from the outermost ServerErrorMiddleware, so both already
+# sit at the ASGI layer and cost nothing on successful requests
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
             "status_code": exc.status_code,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": datetime.utcnow()
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Handle general exceptions."""
     logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
             "status_code": 500,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
     )
 
@@ -369,7 +412,7 @@ async def socketio_info():
         "message": "Socket.IO endpoint",
         "url": "/socket.io/",
         "transports": ["websocket", "polling"],
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow()
     }
 
 # Development server
@@ -12,12 +12,13 @@ from typing import Any, Dict, List, Optional, Tuple
 import httpx
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Query
 from fastapi import status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from config import settings
-from database import get_db
+from database import get_db, get_db_context
 from models import EmotionRecord, EmotionType, DataSource
-from auth import get_current_active_user, User
+from auth import get_current_active_user, CurrentUser
 from socketio_events import sio
 from celery_app import celery_app
 
@@ -29,44 +30,90 @@ ML_BASE_URL = settings.ML_SERVICE_URL
 SINGLE_ENDPOINT = "/predict/emotion"
 BATCH_ENDPOINT = "/predict/batch"
 
-ALLOWED_MIME = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+ALLOWED_MIME = frozenset({"image/jpeg", "image/jpg", "image/png", "image/webp"})
 MAX_BYTES = 5 * 1024 * 1024
 
 
+# Circuit breaker states
+CB_CLOSED, CB_OPEN, CB_HALF_OPEN = 0, 1, 2
+CB_STATE_NAMES = ("closed", "open", "half_open")
+
+
 class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    State and the monotonic time it was entered live in one tuple that is replaced
+    as a whole, so readers never see a new state paired with a stale timestamp.
+    The methods never await, so each call runs atomically on the event loop.
+    """
+
     def __init__(self, failure_threshold: int = 3, reset_timeout_sec: int = 30):
         self.failure_threshold = failure_threshold
         self.reset_timeout_sec = reset_timeout_sec
         self.failures = 0
-        self.state = "closed"  # closed, open, half_open
-        self.opened_at: Optional[float] = None
+        self._state: Tuple[int, float] = (CB_CLOSED, 0.0)
+
+    @property
+    def state(self) -> str:
+        return CB_STATE_NAMES[self._state[0]]
 
     def on_success(self):
         self.failures = 0
-        if self.state != "closed":
-            self.state = "closed"
+        if self._state[0] != CB_CLOSED:
+            self._state = (CB_CLOSED, 0.0)
 
     def on_failure(self):
         self.failures += 1
-        if self.failures >= self.failure_threshold and self.state != "open":
-            self.state = "open"
-            self.opened_at = time.time()
+        if self.failures >= self.failure_threshold and self._state[0] != CB_OPEN:
+            # Also re-opens after a failed half-open probe
+            self._state = (CB_OPEN, time.monotonic())
 
     def allow_request(self) -> bool:
-        if self.state == "closed":
+        state, since = self._state
+        if state == CB_CLOSED:
             return True
-        if self.state == "open":
-            if self.opened_at is None:
-                return False
-            if time.time() - self.opened_at >= self.reset_timeout_sec:
-                # Try a probe request
-                self.state = "half_open"
-                return True
-            return False
-        if self.state == "half_open":
-            # Allow a single probe at a time
+        now = time.monotonic()
+        if now - since >= self.reset_timeout_sec:
+            # Let one probe through per reset window; others wait for its outcome.
+            # Also covers a half-open probe that never reported back (e.g. cancelled)
+            self._state = (CB_HALF_OPEN, now)
             return True
-        return True
+        return False
+
+
+class UploadStream:
+    """
+    Read-only view of an upload's spooled file for httpx multipart bodies.
+    It deliberately has no fileno(): httpx sizes file parts via fileno() first,
+    and on a SpooledTemporaryFile that call rolls the in-memory spool over to a
+    temp file. Without it httpx falls back to seek/tell on the buffer.
+    """
+
+    __slots__ = ("_file",)
+
+    def __init__(self, file):
+        self._file = file
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+
+class CallMetrics:
+    """ML call counters; __slots__ keeps the per-request updates off an instance dict."""
+
+    __slots__ = ("success", "failure", "latency_ms", "requests")
+
+    def __init__(self):
+        self.success = 0
+        self.failure = 0
+        self.latency_ms = 0.0
+        self.requests = 0
 
 
 class MLHttpClient:
@@ -74,43 +121,59 @@ class MLHttpClient:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.retries = retries
-        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        # Created inside the running event loop by open(), closed by aclose() on shutdown
+        self.client: Optional[httpx.AsyncClient] = None
         self.cb = CircuitBreaker()
-        # Metrics
-        self.success_count = 0
-        self.failure_count = 0
-        self.total_latency_ms = 0.0
-        self.total_requests = 0
+        self.stats = CallMetrics()
+
+    def open(self) -> httpx.AsyncClient:
+        """Create the shared pooled client if it does not exist yet."""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Fail fast when the ML service is down instead of waiting out the read timeout
+                timeout=httpx.Timeout(self.timeout, connect=2.0),
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=30.0),
+            )
+        return self.client
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
     async def _request_with_retry(self, method: str, url: str, **kwargs) -> httpx.Response:
         if not self.cb.allow_request():
             logger.warning("Circuit breaker open - skipping request")
             raise HTTPException(status_code=503, detail="ML service unavailable")
 
+        client = self.client or self.open()
+        stats = self.stats
+
         last_exc: Optional[Exception] = None
         for attempt in range(self.retries):
             start = time.perf_counter()
             try:
-                resp = await self.client.request(method, url, **kwargs)
+                resp = await client.request(method, url, **kwargs)
                 latency_ms = (time.perf_counter() - start) * 1000
-                self.total_latency_ms += latency_ms
-                self.total_requests += 1
+                stats.latency_ms += latency_ms
+                stats.requests += 1
                 logger.info(f"ML {method} {url} -> {resp.status_code} in {latency_ms:.1f} ms")
                 if resp.status_code < 500:
                     self.cb.on_success()
                     if 200 <= resp.status_code < 300:
-                        self.success_count += 1
+                        stats.success += 1
                     else:
-                        self.failure_count += 1
+                        stats.failure += 1
                     return resp
                 else:
                     # Server error - retry
                     self.cb.on_failure()
-                    self.failure_count += 1
+                    stats.failure += 1
                     last_exc = HTTPException(status_code=resp.status_code, detail=resp.text)
             except Exception as e:
                 self.cb.on_failure()
-                self.failure_count += 1
+                stats.failure += 1
                 last_exc = e
 
             # Exponential backoff: 0.25, 0.5, 1.0 sec
@@ -120,8 +183,15 @@ class MLHttpClient:
         logger.error(f"ML request failed after {self.retries} attempts: {last_exc}")
         raise HTTPException(status_code=503, detail="ML service request failed")
 
+    @staticmethod
+    def _file_part(file: UploadFile) -> Tuple[str, Any, str]:
+        # Stream the spooled file in chunks instead of copying it into a bytes object;
+        # httpx rewinds it again on every retry
+        file.file.seek(0)
+        return (file.filename or "image.jpg", UploadStream(file.file), file.content_type or "image/jpeg")
+
     async def predict_single(self, file: UploadFile) -> Dict[str, Any]:
-        form = {"file": (file.filename or "image.jpg", await file.read(), file.content_type or "image/jpeg")}
+        form = {"file": self._file_part(file)}
         resp = await self._request_with_retry("POST", SINGLE_ENDPOINT, files=form)
         try:
             return resp.json()
@@ -130,7 +200,7 @@ class MLHttpClient:
             raise HTTPException(status_code=502, detail="Invalid ML response")
 
     async def predict_batch(self, files: List[UploadFile]) -> Dict[str, Any]:
-        form = [("files", (f.filename or "image.jpg", await f.read(), f.content_type or "image/jpeg")) for f in files]
+        form = [("files", self._file_part(f)) for f in files]
         resp = await self._request_with_retry("POST", BATCH_ENDPOINT, files=form)
         try:
             return resp.json()
@@ -139,12 +209,15 @@ class MLHttpClient:
             raise HTTPException(status_code=502, detail="Invalid ML response")
 
     def metrics(self) -> Dict[str, Any]:
-        avg_latency = (self.total_latency_ms / self.total_requests) if self.total_requests else 0.0
+        stats = self.stats
+        # Snapshot once so the average and the totals describe the same moment
+        success, failure, latency_ms, requests = stats.success, stats.failure, stats.latency_ms, stats.requests
+        avg_latency = (latency_ms / requests) if requests else 0.0
         return {
-            "success": self.success_count,
-            "failure": self.failure_count,
+            "success": success,
+            "failure": failure,
             "avg_latency_ms": round(avg_latency, 2),
-            "total_requests": self.total_requests,
+            "total_requests": requests,
             "cb_state": self.cb.state,
         }
 
@@ -156,17 +229,21 @@ def _validate_upload(file: UploadFile):
     if file is None:
         logger.warning("No file uploaded")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "No file uploaded"})
-    if (file.content_type or "").lower() not in ALLOWED_MIME:
+    content_type = file.content_type
+    # Browsers send lowercase types, so only fall back to lower() on a miss
+    if content_type not in ALLOWED_MIME and (content_type or "").lower() not in ALLOWED_MIME:
         logger.warning(f"Invalid file type: {file.content_type}")
         raise HTTPException(status_code=400, detail={"error": "Unsupported file type. Allowed: jpg, jpeg, png, webp"})
-    try:
-        # Determine size without reading whole file into memory permanently
-        pos = file.file.tell()
-        file.file.seek(0, 2)
-        size = file.file.tell()
-        file.file.seek(pos)
-    except Exception:
-        size = None
+    # Starlette counts the bytes while spooling the upload; seek/tell only as a fallback
+    size = file.size
+    if size is None:
+        try:
+            pos = file.file.tell()
+            file.file.seek(0, 2)
+            size = file.file.tell()
+            file.file.seek(pos)
+        except Exception:
+            size = None
     if size is not None and size > MAX_BYTES:
         logger.warning(f"File too large: {size} bytes")
         raise HTTPException(status_code=400, detail={"error": "File too large. Max 5MB"})
@@ -179,24 +256,28 @@ def _map_emotion(label: str) -> EmotionType:
         return EmotionType.NEUTRAL
 
 
+def _insert_emotion_record(db: Session, user_id: Any, label: str, confidence: float, raw: Dict[str, Any]) -> EmotionRecord:
+    record = EmotionRecord(
+        user_id=user_id,
+        emotion=_map_emotion(label),
+        confidence=float(confidence or 0.0),
+        source=DataSource.WEBCAM,
+        raw_data=raw,
+        created_at=datetime.utcnow(),
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+
 async def _save_emotion_record(db: Session, user_id: Any, label: str, confidence: float, raw: Dict[str, Any]):
-    # Retry DB insert on transient errors
+    # Retry DB insert on transient errors; the blocking commit runs in a worker thread
     delay = 0.25
     for attempt in range(3):
         try:
-            record = EmotionRecord(
-                user_id=user_id,
-                emotion=_map_emotion(label),
-                confidence=float(confidence or 0.0),
-                source=DataSource.WEBCAM,
-                raw_data=raw,
-                created_at=datetime.utcnow(),
-            )
-            db.add(record)
-            db.commit()
-            return record
+            return await asyncio.to_thread(_insert_emotion_record, db, user_id, label, confidence, raw)
         except Exception as e:
-            db.rollback()
+            await asyncio.to_thread(db.rollback)
             logger.warning(f"DB insert failed (attempt {attempt+1}): {e}")
             if attempt == 2:
                 raise
@@ -204,6 +285,34 @@ async def _save_emotion_record(db: Session, user_id: Any, label: str, confidence
             delay *= 2
 
 
+def _hour_bucket(db: Session, column):
+    """SQL expression formatting a timestamp as its "%Y-%m-%d %H:00" hour key."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM-DD HH24:00")
+    return func.strftime("%Y-%m-%d %H:00", column)
+
+
+def _aggregate_emotions(db: Session, user_id: Any, since: datetime) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Count a user's emotion records per day and per hour with one GROUP BY query."""
+    hour = _hour_bucket(db, EmotionRecord.created_at).label("hour")
+    rows = (
+        db.query(hour, EmotionRecord.emotion, func.count())
+        .filter(EmotionRecord.user_id == user_id, EmotionRecord.created_at >= since)
+        .group_by(hour, EmotionRecord.emotion)
+        .all()
+    )
+    agg_day: Dict[str, Dict[str, Any]] = {}
+    agg_hour: Dict[str, Dict[str, Any]] = {}
+    for hour_key, emotion, count in rows:
+        emo = emotion.value if emotion else "neutral"
+        # Hour keys start with the day key, so days fold out of the same rows
+        for agg, key in ((agg_day, hour_key[:10]), (agg_hour, hour_key)):
+            entry = agg.setdefault(key, {"count": 0, "emotions": {}})
+            entry["count"] += count
+            entry["emotions"][emo] = entry["emotions"].get(emo, 0) + count
+    return agg_day, agg_hour
+
+
 router = APIRouter(prefix="/api/emotion", tags=["emotion"])
 
 
@@ -211,7 +320,7 @@ router = APIRouter(prefix="/api/emotion", tags=["emotion"])
 async def detect_emotion(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: CurrentUser = Depends(get_current_active_user),
 ):
     """Proxy to ML service single prediction, store result, and emit event."""
     _validate_upload(file)
@@ -257,30 +366,25 @@ async def emotion_history(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: CurrentUser = Depends(get_current_active_user),
 ):
     """Return user's emotion history (last 7 days), aggregated and paginated."""
     since = datetime.utcnow() - timedelta(days=7)
 
+    history = await asyncio.to_thread(_load_emotion_history, db, current_user.id, since, page, limit)
+    history["metrics"] = ml_client.metrics()
+    return history
+
+
+def _load_emotion_history(db: Session, user_id: Any, since: datetime, page: int, limit: int) -> Dict[str, Any]:
+    """Blocking queries behind emotion_history, run in a worker thread."""
     # Paginated raw records
-    q = db.query(EmotionRecord).filter(EmotionRecord.user_id == current_user.id, EmotionRecord.created_at >= since)
+    q = db.query(EmotionRecord).filter(EmotionRecord.user_id == user_id, EmotionRecord.created_at >= since)
     total = q.count()
     records = q.order_by(EmotionRecord.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
 
-    # Aggregation by day and hour
-    agg_day: Dict[str, Dict[str, Any]] = {}
-    agg_hour: Dict[str, Dict[str, Any]] = {}
-    for rec in records:
-        ts = rec.created_at or datetime.utcnow()
-        day_key = ts.strftime("%Y-%m-%d")
-        hour_key = ts.strftime("%Y-%m-%d %H:00")
-        agg_day.setdefault(day_key, {"count": 0, "emotions": {}})
-        agg_hour.setdefault(hour_key, {"count": 0, "emotions": {}})
-        agg_day[day_key]["count"] += 1
-        agg_hour[hour_key]["count"] += 1
-        emo = rec.emotion.value if rec.emotion else "neutral"
-        agg_day[day_key]["emotions"][emo] = agg_day[day_key]["emotions"].get(emo, 0) + 1
-        agg_hour[hour_key]["emotions"][emo] = agg_hour[hour_key]["emotions"].get(emo, 0) + 1
+    # Aggregate the whole 7-day window (not just this page) in the database
+    agg_day, agg_hour = _aggregate_emotions(db, user_id, since)
 
     return {
         "page": page,
@@ -291,7 +395,6 @@ async def emotion_history(
             "by_day": agg_day,
             "by_hour": agg_hour,
         },
-        "metrics": ml_client.metrics(),
     }
 
 
@@ -299,7 +402,7 @@ async def emotion_history(
 async def emotion_batch(
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: CurrentUser = Depends(get_current_active_user),
 ):
     if not files:
         raise HTTPException(status_code=400, detail={"error": "No file uploaded"})
@@ -326,9 +429,6 @@ def process_batch_task(self, user_id: str, filenames: List[str]) -> Dict[str, An
     Note: For simplicity, this placeholder does not stream actual file bytes across process boundaries.
     In production, store uploads temporarily and pass storage keys.
     """
-    from database import get_db_context
-    from sqlalchemy.orm import Session as OrmSession
-
     logger.info(f"Processing batch for user {user_id} with {len(filenames)} files")
     processed = 0
     errors: List[str] = []
@@ -338,7 +438,7 @@ def process_batch_task(self, user_id: str, filenames: List[str]) -> Dict[str, An
             {"emotion": "neutral", "confidence": 0.5},
             {"emotion": "happy", "confidence": 0.8},
         ]
-        with get_db_context() as db:  # type: OrmSession
+        with get_db_context() as db:  # type: Session
             for i, name in enumerate(filenames):
                 pred = mock_predictions[i % len(mock_predictions)]
                 rec = EmotionRecord(
@@ -353,10 +453,9 @@ def process_batch_task(self, user_id: str, filenames: List[str]) -> Dict[str, An
                 processed += 1
         # Emit websocket update
         try:
-            import asyncio as _asyncio
-            loop = _asyncio.get_event_loop()
+            loop = asyncio.get_event_loop()
             if loop.is_running():
-                _asyncio.ensure_future(sio.emit("emotion_batch_progress", {
+                asyncio.ensure_future(sio.emit("emotion_batch_progress", {
                     "user_id": user_id,
                     "processed": processed,
                     "errors": errors,
@@ -370,6 +469,6 @@ def process_batch_task(self, user_id: str, filenames: List[str]) -> Dict[str, An
         raise self.retry(countdown=2 ** self.request.retries, exc=exc)
 
 
-__all__ = ["router"]
+__all__ = ["router", "ml_client"]
 
 
@@ -3,21 +3,37 @@ SQLAlchemy models for the Mind Bridge AI application.
 Defines comprehensive database schema for mental health and wellness platform.
 """
 
+import os
+import time
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, Dict, Any, List
 from enum import Enum
 
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Boolean, ForeignKey, 
+    Column, Integer, SmallInteger, String, Text, DateTime, Boolean, ForeignKey, 
     JSON, Float, Enum as SQLEnum, Index, CheckConstraint, UniqueConstraint,
-    TypeDecorator, CHAR
+    TypeDecorator, CHAR, DDL, event, false, text
 )
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUID (RFC 9562 version 7).
+    The leading 48 bits are a millisecond timestamp, so new primary keys land on
+    the right edge of the btree instead of random pages.
+    """
+    value = ((time.time_ns() // 1_000_000) << 80) | int.from_bytes(os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version 7
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+# Binary JSONB on PostgreSQL, plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 # Custom GUID type for cross-database compatibility
 class GUID(TypeDecorator):
     """
@@ -51,6 +67,31 @@ class GUID(TypeDecorator):
         else:
             return uuid.UUID(value)
 
+class SmallIntEnum(TypeDecorator):
+    """
+    Stores an Enum member as a SMALLINT code (its position in the enum plus offset).
+    Members may only ever be appended; reordering changes stored values.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class, offset: int = 0, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enum_class = enum_class
+        self.offset = offset
+        self._members = list(enum_class)
+        self._codes = {member: code + offset for code, member in enumerate(self._members)}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self._codes[self.enum_class(value)]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._members[value - self.offset]
+
 # Enums
 class MoodLevel(str, Enum):
     VERY_NEGATIVE = "very_negative"
@@ -90,12 +131,17 @@ class MessageType(str, Enum):
     SYSTEM = "system"
     EMERGENCY = "emergency"
 
+class Sentiment(str, Enum):
+    NEGATIVE = "negative"
+    NEUTRAL = "neutral"
+    POSITIVE = "positive"
+
 class AIResponse(Base):
     """AI response model linked to chat messages."""
     __tablename__ = "ai_responses"
 
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Foreign key to ChatMessage (required)
     message_id = Column(GUID(), ForeignKey("chat_messages.id", ondelete="CASCADE"), nullable=False)
@@ -114,20 +160,20 @@ class AIResponse(Base):
     confidence_score = Column(Float)
 
     # Analysis results
-    sentiment = Column(String(50))
-    emotions = Column(JSON)
-    topics = Column(JSON)
-    suggestions = Column(JSON)
+    sentiment = Column(SmallIntEnum(Sentiment, offset=-1))  # negative=-1, neutral=0, positive=1
+    emotions = Column(JSONType)
+    topics = Column(JSONType)
+    suggestions = Column(JSONType)
 
     # User feedback
-    is_helpful = Column(Boolean, default=False)
+    is_helpful = Column(Boolean, default=False, server_default=false(), nullable=False)
     user_rating = Column(Integer)
     feedback = Column(Text)
 
     # Status flags
     is_generated = Column(Boolean, default=True)
-    is_reviewed = Column(Boolean, default=False)
-    is_approved = Column(Boolean, default=False)
+    is_reviewed = Column(Boolean, default=False, server_default=false(), nullable=False)
+    is_approved = Column(Boolean, default=False, server_default=false(), nullable=False)
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -140,10 +186,12 @@ class AIResponse(Base):
     __table_args__ = (
         CheckConstraint('confidence_score IS NULL OR (confidence_score >= 0.0 AND confidence_score <= 1.0)', name='confidence_score_range'),
         CheckConstraint('user_rating IS NULL OR (user_rating >= 1 AND user_rating <= 5)', name='user_rating_range'),
+        CheckConstraint('sentiment IS NULL OR (sentiment >= -1 AND sentiment <= 1)', name='sentiment_range'),
         CheckConstraint('length(content) > 0', name='content_not_empty'),
         Index('idx_ai_response_message_created', 'message_id', 'created_at'),
         Index('idx_ai_response_model_created', 'model_name', 'created_at'),
-        Index('idx_ai_response_helpful', 'is_helpful'),
+        Index('idx_ai_response_helpful', 'message_id',
+              postgresql_where=text('is_helpful = true'), sqlite_where=text('is_helpful = 1')),
     )
     
     def __repr__(self):
@@ -163,7 +211,7 @@ class AIResponse(Base):
             "tokens_used": self.tokens_used,
             "processing_time": self.processing_time,
             "confidence_score": self.confidence_score,
-            "sentiment": self.sentiment,
+            "sentiment": self.sentiment.value if self.sentiment else None,
             "emotions": self.emotions,
             "topics": self.topics,
             "suggestions": self.suggestions,
@@ -183,7 +231,7 @@ class User(Base):
     __tablename__ = "users"
     
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Authentication fields
     email = Column(String(255), unique=True, nullable=False, index=True)
@@ -201,8 +249,11 @@ class User(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     email_verified = Column(Boolean, default=False, nullable=False)
     
+    # Tokens issued before this instant are rejected ("log out everywhere")
+    token_invalidated_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Privacy and settings
-    privacy_settings = Column(JSON, default=dict, nullable=False)
+    privacy_settings = Column(JSONType, default=dict, nullable=False)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -249,7 +300,10 @@ class User(Base):
         CheckConstraint('length(email) > 0', name='email_not_empty'),
         CheckConstraint('length(password_hash) > 0', name='password_hash_not_empty'),
         Index('idx_user_email_active', 'email', 'is_active'),
-        Index('idx_user_created_at', 'created_at'),
+        Index('idx_user_created_at', 'created_at',
+              postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
+        # Daily metrics count active users by updated_at
+        Index('idx_user_active_updated', 'is_active', 'updated_at'),
     )
     
     def __repr__(self):
@@ -271,22 +325,26 @@ class User(Base):
         }
 
 class EmotionRecord(Base):
-    """Emotion detection record model."""
+    """
+    Emotion detection record model.
+    The migrations create this table range-partitioned by created_at with a
+    (id, created_at) primary key; the ORM still identifies rows by id.
+    """
     __tablename__ = "emotion_records"
     
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Foreign key to User
     user_id = Column(GUID(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
     # Emotion detection data
-    emotion = Column(SQLEnum(EmotionType), nullable=False)
+    emotion = Column(SmallIntEnum(EmotionType), nullable=False)
     confidence = Column(Float, nullable=False)
-    source = Column(SQLEnum(DataSource), nullable=False)
+    source = Column(SmallIntEnum(DataSource), nullable=False)
     
     # Raw ML output data
-    raw_data = Column(JSON, default=dict, nullable=False)
+    raw_data = Column(JSONType, default=dict, nullable=False)
     
     # Timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -297,9 +355,12 @@ class EmotionRecord(Base):
     # Constraints
     __table_args__ = (
         CheckConstraint('confidence >= 0.0 AND confidence <= 1.0', name='confidence_range'),
-        Index('idx_emotion_user_created', 'user_id', 'created_at'),
-        Index('idx_emotion_type_created', 'emotion', 'created_at'),
-        Index('idx_emotion_source_created', 'source', 'created_at'),
+        CheckConstraint('emotion BETWEEN 0 AND 6', name='emotion_range'),
+        CheckConstraint('source BETWEEN 0 AND 2', name='source_range'),
+        # Covering index for per-user timelines; type/source scans use the BRIN
+        Index('idx_emotion_user_created', user_id, created_at.desc(),
+              postgresql_include=['emotion', 'source', 'confidence']),
+        Index('idx_emotion_brin', 'emotion', 'source', 'created_at', postgresql_using='brin'),
     )
     
     def __repr__(self):
@@ -322,7 +383,7 @@ class PeerConnection(Base):
     __tablename__ = "peer_connections"
     
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Foreign keys to User
     requester_id = Column(GUID(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -347,7 +408,8 @@ class PeerConnection(Base):
         UniqueConstraint('requester_id', 'target_id', name='unique_connection_pair'),
         Index('idx_peer_requester_status', 'requester_id', 'status'),
         Index('idx_peer_target_status', 'target_id', 'status'),
-        Index('idx_peer_created_at', 'created_at'),
+        Index('idx_peer_created_at', 'created_at',
+              postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
     )
     
     def __repr__(self):
@@ -370,15 +432,15 @@ class CrisisAlert(Base):
     __tablename__ = "crisis_alerts"
     
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Foreign key to User
     user_id = Column(GUID(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
     # Crisis assessment data
-    risk_level = Column(SQLEnum(RiskLevel), nullable=False)
+    risk_level = Column(SmallIntEnum(RiskLevel), nullable=False)
     prediction_confidence = Column(Float, nullable=False)
-    triggers = Column(JSON, default=list, nullable=False)  # Array of trigger factors
+    triggers = Column(JSONType, default=list, nullable=False)  # Array of trigger factors
     
     # Resolution tracking
     resolved_at = Column(DateTime(timezone=True), nullable=True)
@@ -393,9 +455,17 @@ class CrisisAlert(Base):
     __table_args__ = (
         CheckConstraint('prediction_confidence >= 0.0 AND prediction_confidence <= 1.0', name='prediction_confidence_range'),
         CheckConstraint('resolved_at IS NULL OR resolved_at >= created_at', name='resolution_after_creation'),
+        CheckConstraint('risk_level BETWEEN 0 AND 3', name='risk_level_range'),
         Index('idx_crisis_user_created', 'user_id', 'created_at'),
-        Index('idx_crisis_risk_level', 'risk_level'),
-        Index('idx_crisis_unresolved', 'user_id', 'resolved_at'),
+        # Only high (2) and critical (3) alerts are looked up by risk level
+        Index('idx_crisis_high_risk', user_id, created_at.desc(),
+              postgresql_where=text('risk_level IN (2, 3)'), sqlite_where=text('risk_level IN (2, 3)')),
+        # Crisis checks count a user's unresolved alerts in the last 24 hours
+        Index('idx_crisis_user_created_unresolved', 'user_id', 'created_at',
+              postgresql_where=text('resolved_at IS NULL'), sqlite_where=text('resolved_at IS NULL')),
+        # Retention cleanup deletes resolved alerts by resolved_at
+        Index('idx_crisis_resolved_at', 'resolved_at',
+              postgresql_where=text('resolved_at IS NOT NULL'), sqlite_where=text('resolved_at IS NOT NULL')),
     )
     
     def __repr__(self):
@@ -418,7 +488,7 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
     # Primary key as UUID
-    id = Column(GUID(), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(GUID(), primary_key=True, default=uuid7)
     
     # Foreign keys to User
     sender_id = Column(GUID(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -426,7 +496,7 @@ class ChatMessage(Base):
     
     # Message content (encrypted)
     content = Column(Text, nullable=False)  # Encrypted text content
-    message_type = Column(SQLEnum(MessageType), default=MessageType.TEXT, nullable=False)
+    message_type = Column(SmallIntEnum(MessageType), default=MessageType.TEXT, nullable=False)
     
     # Read status
     read_at = Column(DateTime(timezone=True), nullable=True)
@@ -444,10 +514,14 @@ class ChatMessage(Base):
         CheckConstraint('sender_id != receiver_id', name='no_self_message'),
         CheckConstraint('length(content) > 0', name='content_not_empty'),
         CheckConstraint('read_at IS NULL OR read_at >= created_at', name='read_after_creation'),
+        CheckConstraint('message_type BETWEEN 0 AND 2', name='message_type_range'),
         Index('idx_message_sender_created', 'sender_id', 'created_at'),
         Index('idx_message_receiver_created', 'receiver_id', 'created_at'),
-        Index('idx_message_unread', 'receiver_id', 'read_at'),
+        Index('idx_message_unread', 'receiver_id', 'created_at',
+              postgresql_where=text('read_at IS NULL'), sqlite_where=text('read_at IS NULL')),
         Index('idx_message_type_created', 'message_type', 'created_at'),
+        Index('idx_message_created_at', 'created_at',
+              postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
     )
     
     def __repr__(self):
@@ -465,6 +539,48 @@ class ChatMessage(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
+# PostgreSQL storage parameters for create_all (kept in sync with the migrations)
+_PG_STORAGE_PARAMETERS = {
+    User.__table__: "fillfactor = 90",
+    EmotionRecord.__table__: "fillfactor = 100",
+    PeerConnection.__table__: "fillfactor = 90",
+    CrisisAlert.__table__: "fillfactor = 90",
+    ChatMessage.__table__: "fillfactor = 90, autovacuum_vacuum_scale_factor = 0.02",
+    AIResponse.__table__: "fillfactor = 90, autovacuum_vacuum_scale_factor = 0.02",
+}
+
+for _table, _params in _PG_STORAGE_PARAMETERS.items():
+    event.listen(
+        _table,
+        "after_create",
+        DDL(f"ALTER TABLE {_table.name} SET ({_params})").execute_if(dialect="postgresql"),
+    )
+
+# emotion_records partitions (PostgreSQL, created by the migrations): one
+# emotion_records_YYYYmMM range partition per calendar month plus a DEFAULT one.
+# The maintain_emotion_partitions task keeps this many months ahead in place, so
+# new rows never land in DEFAULT (which would block creating their month later).
+EMOTION_PARTITIONS_AHEAD = 3
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def emotion_partition_months(today: date, ahead: int = EMOTION_PARTITIONS_AHEAD) -> List[date]:
+    """First day of today's month and of each of the `ahead` months after it."""
+    first = today.replace(day=1)
+    return [_add_months(first, n) for n in range(ahead + 1)]
+
+def emotion_partition_name(month: date) -> str:
+    return f"emotion_records_{month:%Y}m{month:%m}"
+
+def emotion_partition_ddl(month: date) -> str:
+    """CREATE TABLE IF NOT EXISTS for the partition covering `month`."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {emotion_partition_name(month)} PARTITION OF emotion_records "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
 # Additional utility functions
 def get_user_by_email(session, email: str) -> Optional[User]:
     """Get user by email address."""
@@ -2,7 +2,8 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 
-from jose import jwt, JWTError
+import jwt
+from jwt import InvalidTokenError as JWTError
 from passlib.context import CryptContext
 
 from config import settings
@@ -10,7 +11,23 @@ from config import settings
 logger = logging.getLogger(__name__)
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# JWT key material. HS* algorithms sign with SECRET_KEY directly; for RS/ES/PS the
+# PEM keys are parsed once here rather than on every encode/decode.
+if settings.ALGORITHM.startswith(("RS", "ES", "PS")):
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+    JWT_SIGNING_KEY = load_pem_private_key(settings.JWT_PRIVATE_KEY.encode(), password=None)
+    JWT_VERIFY_KEY = load_pem_public_key(settings.JWT_PUBLIC_KEY.encode())
+else:
+    JWT_SIGNING_KEY = JWT_VERIFY_KEY = settings.SECRET_KEY
+
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    deprecated="auto",
+)
 
 
 def hash_password(password: str) -> str:
@@ -28,13 +45,13 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(hours=1))
     to_encode.update({"exp": expire})
-    token = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    token = jwt.encode(to_encode, JWT_SIGNING_KEY, algorithm=settings.ALGORITHM)
     return token
 
 
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(token, JWT_VERIFY_KEY, algorithms=[settings.ALGORITHM])
         return payload
     except JWTError as e:
         logger.warning(f"JWT decode error: {e}")
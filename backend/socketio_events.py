@@ -377,7 +377,7 @@ async def get_current_user_from_token(token: str) -> Optional[User]:
         from auth import verify_token
         from database import get_db_context
         
-        token_data = verify_token(token, "access")
+        token_data = await verify_token(token, "access")
         
         with get_db_context() as db:
             user = db.query(User).filter(User.id == token_data.user_id).first()
@@ -50,8 +50,7 @@ def backup_user_data():
             
             # Create backup directory
             backup_dir = "backups"
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
+            os.makedirs(backup_dir, exist_ok=True)
             
             # Create backup file
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")